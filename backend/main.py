@@ -12,6 +12,7 @@ from datetime import datetime, timedelta
 import logging
 import json
 import time
+import hmac
 
 import boto3
 import botocore
@@ -23,10 +24,11 @@ load_dotenv(dotenv_path=env_path)
 
 # Services
 from services.fetch_company_metadata import analyze_url
-from services.discover_maps_locations import discover_maps_links
+from services.discover_maps_locations import discover_maps_links, notify_task_ready
 from services.fetch_app_ids import resolve_app_ids
 from services.fetch_reviews import run_scraper_service
 from services.analyze_reviews import generate_dimensions, analyze_reviews
+from services import json_utils
 
 # Database & Auth
 from database import init_db, get_db, User, CompanyModel, Review, Dimension, get_user_limits, SessionLocal, Portfolio, user_portfolios, PortfolioInvitation
@@ -178,7 +180,7 @@ def update_job_status(job_id: str, status: str, message: str, task_type: str="pr
             s3.put_object(
                 Bucket=S3_BUCKET_NAME,
                 Key=f"job_status/{job_id}",
-                Body=json.dumps(full_data),
+                Body=json_utils.dumps(full_data),
                 Metadata=metadata_headers,
                 ContentType='application/json'
             )
@@ -230,7 +232,7 @@ def check_portfolio_access(db: Session, user_id: int, portfolio_id: int):
             s3.put_object(
                 Bucket=S3_BUCKET_NAME,
                 Key=f"job_status/{job_id}",
-                Body=json.dumps(payload),
+                Body=json_utils.dumps(payload),
                 ContentType='application/json',
                 Metadata=metadata
             )
@@ -429,14 +431,10 @@ def task_reanalyze_all(portfolio_id: int):
         
         # 4. Trigger re-analysis for each job_id sequentially
         for (job_id,) in job_ids:
-            # Clear S3 checkpoints for this analysis job
-            from services.analyze_reviews import get_checkpoint_key
-            s3_client = boto3.client('s3', region_name=AWS_REGION)
+            # Clear checkpoints (legacy key, delta parts and local file) for this analysis job
+            from services.analyze_reviews import delete_checkpoint
             analysis_job_id = f"analysis_{job_id}"
-            try:
-                s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=get_checkpoint_key(analysis_job_id))
-            except Exception:
-                pass # Checkpoint might not exist, ignore error
+            delete_checkpoint(analysis_job_id)
             
             logger.info(f"Triggering re-analysis for job: {job_id}")
             # file_path=None because analyze_reviews fetches from DB based on job_id
@@ -1348,6 +1346,21 @@ async def api_discover_maps(request: dict, background_tasks: BackgroundTasks, cu
     
     return {"job_id": discovery_job_id, "status": "processing"}
 
+@app.get("/api/dataforseo/pingback")
+async def dataforseo_pingback(id: str, secret: str = ""):
+    """
+    Called by DataForSEO when a Maps discovery task finishes (see DATAFORSEO_PINGBACK_URL).
+    The URL carries DATAFORSEO_PINGBACK_SECRET; calls without it are rejected.
+    Only wakes up a discovery already waiting on that task in this process; unknown ids are ignored.
+    Pingbacks therefore only speed things up in single-worker deployments. With several workers
+    the callback usually lands on a process that isn't waiting, and tasks_ready polling picks the task up.
+    """
+    expected = os.getenv("DATAFORSEO_PINGBACK_SECRET", "")
+    if not expected or not hmac.compare_digest(secret.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Invalid pingback secret")
+    accepted = notify_task_ready(id)
+    return {"status": "ok", "accepted": accepted}
+
 @app.get("/api/user/reviews")
 async def get_user_reviews(
     portfolio_id: int,
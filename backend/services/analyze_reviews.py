@@ -1,21 +1,200 @@
 import pandas as pd
-from openai import OpenAI
+import openai
+from openai import OpenAI, AsyncOpenAI
+import asyncio
 import json
 import logging
 import boto3
+from botocore.config import Config
+import functools
+import gzip
+import hashlib
+import io
 import os
+import random
+import time
 from datetime import datetime
+from services import json_utils
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Transient OpenAI failures worth retrying before falling back to a neutral result
+RETRYABLE_OPENAI_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+OPENAI_MAX_ATTEMPTS = 3
+
+# Reviews sent per request, so the system prompt is paid once per batch
+ANALYSIS_BATCH_SIZE = max(1, int(os.getenv("ANALYSIS_BATCH_SIZE", "8")))
+
+# Number of analysis requests kept in flight at once
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "20"))
+
+# Account rate limits for the analysis model; requests are throttled to stay under them
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))
+
+# Minimum seconds between "running" status writes to S3 while analyzing
+STATUS_UPDATE_INTERVAL = float(os.getenv("ANALYSIS_STATUS_INTERVAL", "5"))
+
+# S3-backed cache of model answers, keyed by content hash, so re-running the same
+# reviews does not pay for the same OpenAI calls again. Bump the version whenever
+# the prompt or output format changes to invalidate old entries.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PREFIX = "llm_cache/"
+ANALYSIS_PROMPT_VERSION = 2
+DIMENSIONS_PROMPT_VERSION = 1
+LLM_CACHE_FETCH_WORKERS = 32
+
+# Written for reviews the model could not analyze so indices stay aligned
+NEUTRAL_RESULT = {
+    "sentiment": "Neutral",
+    "emotion": "Indifferent",
+    "confidence": 0.0,
+    "topics": []
+}
+
+# Batch analysis prompt; {dimensions} is filled in once per run
+ANALYSIS_SYSTEM_PROMPT_TEMPLATE = """You are an expert Customer Experience Analyst.
+
+Analyze EACH of the customer reviews provided and extract, per review:
+1. Multi-level sentiment analysis
+2. Structured experience dimensions (topics)
+
+The reviews are given as a JSON array of objects with "id" and "text".
+
+Return ONLY valid JSON in this EXACT format with no additional text, no markdown formatting, no code blocks.
+The "results" array must contain exactly one entry per review, using the same "id":
+{
+  "results": [
+    {
+      "id": 0,
+      "sentiment": "Positive",
+      "emotion": "Delighted",
+      "confidence": 0.95,
+      "topics": [
+        {
+          "dimension": "Dimension Name Here",
+          "sentiment": "Positive",
+          "mentioned": true
+        }
+      ]
+    }
+  ]
+}
+
+SENTIMENT GUIDELINES:
+- Overall Sentiment: Choose ONLY: Positive, Neutral, or Negative
+- Emotional Tone: Choose ONLY from: Delighted, Satisfied, Frustrated, Disappointed, Angry, Surprised, Confused, or Indifferent
+- Confidence: A number between 0.00 and 1.00 (higher when language is explicit and clear)
+
+Distinguish severity examples:
+- "A bit expensive" → sentiment: Negative, emotion: Disappointed, confidence: 0.70
+- "Worst service ever" → sentiment: Negative, emotion: Angry, confidence: 0.95
+- "Product was amazing" → sentiment: Positive, emotion: Delighted, confidence: 0.90
+- "It's okay" → sentiment: Neutral, emotion: Indifferent, confidence: 0.60
+
+TOPIC/DIMENSION GUIDELINES:
+Extract ONLY the experience dimensions that are explicitly mentioned in each review.
+
+Use ONLY these predefined dimensions (use exact names):
+{dimensions}
+
+For each mentioned dimension:
+- Set "mentioned": true
+- Indicate sentiment for that specific dimension: Positive, Neutral, or Negative
+- Use the EXACT dimension name from the list above
+
+ONLY include dimensions that are clearly referenced in the review. If a dimension is not mentioned, do NOT include it in the topics array.
+
+The reviews may contain English, Arabic, or both languages. Analyze each one independently.
+
+Remember: Return ONLY the JSON object. No explanations, no markdown code blocks, no additional text."""
+
+
+def _create_completion_with_retry(client, max_attempts=OPENAI_MAX_ATTEMPTS, min_wait=2.0, max_wait=30.0, **kwargs):
+    """
+    Calls client.chat.completions.create, retrying transient errors with exponential backoff.
+    Re-raises the last error once all attempts are exhausted.
+    """
+    for attempt in range(max_attempts):
+        try:
+            return client.chat.completions.create(**kwargs)
+        except RETRYABLE_OPENAI_ERRORS as e:
+            if attempt == max_attempts - 1:
+                raise
+            wait_time = min(max_wait, min_wait * (2 ** attempt))
+            logger.warning(f"OpenAI call failed ({type(e).__name__}), retry {attempt + 1}/{max_attempts - 1} in {wait_time}s")
+            time.sleep(wait_time)
+
+class AsyncRateLimiter:
+    """
+    Token bucket over requests-per-minute and tokens-per-minute.
+    Both buckets refill continuously; acquire() waits until a request fits in both,
+    so bursts are smoothed out before they turn into 429s.
+    """
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.available_requests = float(rpm)
+        self.available_tokens = float(tpm)
+        self.last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        self.available_requests = min(self.rpm, self.available_requests + elapsed * self.rpm / 60)
+        self.available_tokens = min(self.tpm, self.available_tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, estimated_tokens):
+        estimated_tokens = min(estimated_tokens, self.tpm)
+        # Waiters queue on the lock, so capacity is handed out in arrival order
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.available_requests >= 1 and self.available_tokens >= estimated_tokens:
+                    self.available_requests -= 1
+                    self.available_tokens -= estimated_tokens
+                    return
+                wait_time = max(
+                    (1 - self.available_requests) * 60 / self.rpm,
+                    (estimated_tokens - self.available_tokens) * 60 / self.tpm,
+                    0.05
+                )
+                await asyncio.sleep(wait_time)
+
+async def _acreate_completion_with_retry(client, max_attempts=OPENAI_MAX_ATTEMPTS, min_wait=2.0, max_wait=30.0,
+                                         rate_limiter=None, estimated_tokens=0, **kwargs):
+    """
+    Async counterpart of _create_completion_with_retry for AsyncOpenAI clients.
+    When a rate_limiter is given, every attempt first reserves capacity from it.
+    """
+    for attempt in range(max_attempts):
+        if rate_limiter:
+            await rate_limiter.acquire(estimated_tokens)
+        try:
+            return await client.chat.completions.create(**kwargs)
+        except RETRYABLE_OPENAI_ERRORS as e:
+            if attempt == max_attempts - 1:
+                raise
+            # Jitter keeps concurrent batches from retrying in lockstep
+            wait_time = min(max_wait, min_wait * (2 ** attempt)) + random.random()
+            logger.warning(f"OpenAI call failed ({type(e).__name__}), retry {attempt + 1}/{max_attempts - 1} in {wait_time:.1f}s")
+            await asyncio.sleep(wait_time)
+
 # --- Helper for Status Updates (Matches logic in main.py but imported here for worker usage) ---
 def update_analysis_status(job_id, status, message, processed=0, total=0, error=None, **kwargs):
     if not job_id: return
     
     try:
-        s3 = boto3.client('s3', region_name=os.getenv("AWS_REGION", "eu-central-1"))
+        s3 = get_s3_client()
         bucket = os.getenv("S3_BUCKET_NAME", "horus-voc-data-storage-v2-eu")
         
         payload = {
@@ -44,73 +223,255 @@ def update_analysis_status(job_id, status, message, processed=0, total=0, error=
         s3.put_object(
             Bucket=bucket,
             Key=f"job_status/{job_id}",
-            Body=json.dumps(payload),
+            Body=json_utils.dumps(payload),
             ContentType='application/json',
             Metadata=metadata
         )
     except Exception as e:
         logger.error(f"Failed to update status in S3 for {job_id}: {e}")
 
+def _canonicalize_topics(topics, dim_names):
+    """
+    Maps topic dimension names onto the configured dimensions (case-insensitive)
+    and drops topics the model invented.
+    """
+    canonical_topics = []
+    for topic in topics or []:
+        if not isinstance(topic, dict):
+            continue
+        canonical = dim_names.get(str(topic.get('dimension', '')).casefold())
+        if canonical:
+            canonical_topics.append(dict(topic, dimension=canonical))
+    return canonical_topics
+
+# Analysis results are written back to the DB, so the CSV path only ever needs the review text
+CSV_ANALYSIS_COLUMNS = ['text']
+
+def _read_reviews_csv(source):
+    """
+    Reads the columns needed for analysis from a reviews CSV with the multithreaded
+    pyarrow engine (Arrow-backed columns), falling back to the default C engine when
+    pyarrow is not installed. Unused columns are never materialized.
+    """
+    try:
+        return pd.read_csv(source, engine='pyarrow', dtype_backend='pyarrow', usecols=CSV_ANALYSIS_COLUMNS)
+    except ImportError:
+        logger.info("pyarrow not installed, using the default CSV engine")
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return pd.read_csv(source, usecols=CSV_ANALYSIS_COLUMNS)
+
+@functools.lru_cache(maxsize=1)
 def get_s3_client():
+    # boto3 clients are thread-safe; one shared client keeps its connection pool warm
+    # across status updates, checkpoint uploads and the input read
     return boto3.client(
         's3', 
         region_name=os.getenv("AWS_REGION", "eu-central-1"),
-        config=boto3.session.Config(signature_version='s3v4')
+        config=Config(
+            signature_version='s3v4',
+            max_pool_connections=50,
+            retries={'max_attempts': 3, 'mode': 'adaptive'}
+        )
     )
 
+# Results are appended here as they complete so a crash between S3 checkpoints loses nothing
+LOCAL_CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+
 def get_checkpoint_key(job_id):
+    # Legacy single-object checkpoint; still read on resume and removed on cleanup
     return f"checkpoints/{job_id}.json"
 
+def get_checkpoint_prefix(job_id):
+    return f"checkpoints/{job_id}/"
+
+def get_local_checkpoint_path(job_id):
+    return os.path.join(LOCAL_CHECKPOINT_DIR, f"ckpt_{job_id}.jsonl")
+
+def load_local_checkpoint(job_id):
+    """
+    Loads results appended to the local JSONL checkpoint since the last S3 checkpoint.
+    Returns a list of {"index", "result"} items or empty list.
+    """
+    if not job_id: return []
+
+    path = get_local_checkpoint_path(job_id)
+    if not os.path.exists(path):
+        return []
+
+    results = []
+    try:
+        with open(path, 'rb') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    results.append(json_utils.loads(line))
+                except ValueError:
+                    # A crash mid-write can leave a truncated last line
+                    logger.warning(f"Skipping unreadable checkpoint line for {job_id}")
+    except Exception as e:
+        logger.warning(f"Failed to read local checkpoint for {job_id}: {e}")
+    return results
+
+def _list_checkpoint_part_keys(s3, bucket, job_id):
+    keys = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=get_checkpoint_prefix(job_id)):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []))
+    return sorted(keys)
+
+def _read_checkpoint_body(response):
+    # boto3 does not decode Content-Encoding; legacy checkpoints were written uncompressed
+    body = response['Body'].read()
+    if response.get('ContentEncoding') == 'gzip':
+        return gzip.decompress(body)
+    return body
+
 def load_checkpoint(job_id):
     """
     Loads intermediate results from S3 if they exist.
+    Concatenates the legacy single-object checkpoint (if any) with all delta parts.
     Returns a list of previously analyzed results or empty list.
     """
     if not job_id: return []
     
     bucket = os.getenv("S3_BUCKET_NAME", "horus-voc-data-storage-v2-eu")
-    key = get_checkpoint_key(job_id)
+    data = []
     
     try:
         s3 = get_s3_client()
-        response = s3.get_object(Bucket=bucket, Key=key)
-        data = json.loads(response['Body'].read().decode('utf-8'))
-        logger.info(f"🔄 Resuming job {job_id} from checkpoint. Loaded {len(data)} results.")
+        try:
+            response = s3.get_object(Bucket=bucket, Key=get_checkpoint_key(job_id))
+            data.extend(json_utils.loads(_read_checkpoint_body(response)))
+        except s3.exceptions.NoSuchKey:
+            pass
+
+        for key in _list_checkpoint_part_keys(s3, bucket, job_id):
+            response = s3.get_object(Bucket=bucket, Key=key)
+            data.extend(json_utils.loads(_read_checkpoint_body(response)))
+
+        if data:
+            logger.info(f"🔄 Resuming job {job_id} from checkpoint. Loaded {len(data)} results.")
+        else:
+            logger.info(f"No checkpoint found for job {job_id}. Starting fresh.")
         return data
-    except s3.exceptions.NoSuchKey:
-        logger.info(f"No checkpoint found for job {job_id}. Starting fresh.")
-        return []
     except Exception as e:
         logger.warning(f"Failed to load checkpoint for {job_id}: {e}")
         return []
 
-def save_checkpoint(job_id, results):
+def save_checkpoint(job_id, results, offset):
     """
-    Saves current list of results to S3.
+    Saves the results completed since the previous save as a new checkpoint part.
+    `offset` is the position of results[0] in the overall result list and names the part,
+    so each save writes only the delta instead of the whole list.
     """
-    if not job_id: return
+    if not job_id or not results: return
 
     bucket = os.getenv("S3_BUCKET_NAME", "horus-voc-data-storage-v2-eu")
-    key = get_checkpoint_key(job_id)
+    key = f"{get_checkpoint_prefix(job_id)}part-{offset:07d}.json"
     
     try:
         s3 = get_s3_client()
         s3.put_object(
             Bucket=bucket,
             Key=key,
-            Body=json.dumps(results),
-            ContentType='application/json'
+            Body=gzip.compress(json_utils.dumps(results), compresslevel=5),
+            ContentType='application/json',
+            ContentEncoding='gzip'
         )
-        logger.info(f"💾 Checkpoint saved for {job_id}: {len(results)} records.")
+        logger.info(f"💾 Checkpoint saved for {job_id}: {offset + len(results)} records.")
     except Exception as e:
         logger.error(f"Failed to save checkpoint for {job_id}: {e}")
 
 
+def delete_checkpoint(job_id):
+    """
+    Removes the checkpoint for a job once its results are persisted.
+    """
+    if not job_id: return
+
+    bucket = os.getenv("S3_BUCKET_NAME", "horus-voc-data-storage-v2-eu")
+
+    try:
+        s3 = get_s3_client()
+        s3.delete_object(Bucket=bucket, Key=get_checkpoint_key(job_id))
+        part_keys = _list_checkpoint_part_keys(s3, bucket, job_id)
+        # delete_objects accepts at most 1000 keys per call
+        for i in range(0, len(part_keys), 1000):
+            s3.delete_objects(
+                Bucket=bucket,
+                Delete={'Objects': [{'Key': key} for key in part_keys[i:i + 1000]], 'Quiet': True}
+            )
+        logger.info(f"🧹 Removed checkpoint for {job_id} after success.")
+    except Exception as e:
+        logger.warning(f"Failed to delete checkpoint: {e}")
+
+    try:
+        local_path = get_local_checkpoint_path(job_id)
+        if os.path.exists(local_path):
+            os.remove(local_path)
+    except Exception as e:
+        logger.warning(f"Failed to delete local checkpoint: {e}")
+
+
+def _llm_cache_key(*parts):
+    return hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+def _llm_cache_get(kind, key):
+    """Returns the cached value for key, or None on a miss or any S3 error."""
+    bucket = os.getenv("S3_BUCKET_NAME", "horus-voc-data-storage-v2-eu")
+    s3 = get_s3_client()
+    try:
+        response = s3.get_object(Bucket=bucket, Key=f"{LLM_CACHE_PREFIX}{kind}/{key}.json")
+        return json_utils.loads(response['Body'].read())
+    except s3.exceptions.NoSuchKey:
+        return None
+    except Exception as e:
+        logger.warning(f"LLM cache read failed for {kind}/{key}: {e}")
+        return None
+
+def _llm_cache_list_keys(kind):
+    """Returns the keys cached under kind with one paginated listing, or an empty set on any S3 error."""
+    bucket = os.getenv("S3_BUCKET_NAME", "horus-voc-data-storage-v2-eu")
+    prefix = f"{LLM_CACHE_PREFIX}{kind}/"
+    keys = set()
+    try:
+        paginator = get_s3_client().get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            keys.update(obj['Key'][len(prefix):-len(".json")] for obj in page.get('Contents', []))
+    except Exception as e:
+        logger.warning(f"LLM cache listing failed for {kind}: {e}")
+    return keys
+
+def _llm_cache_put(kind, key, value):
+    bucket = os.getenv("S3_BUCKET_NAME", "horus-voc-data-storage-v2-eu")
+    try:
+        get_s3_client().put_object(
+            Bucket=bucket,
+            Key=f"{LLM_CACHE_PREFIX}{kind}/{key}.json",
+            Body=json_utils.dumps(value),
+            ContentType='application/json'
+        )
+    except Exception as e:
+        logger.warning(f"LLM cache write failed for {kind}/{key}: {e}")
+
+
+@functools.lru_cache(maxsize=4)
+def get_openai_client(openai_key):
+    """
+    Sync OpenAI client per key, reused so its HTTP connection pool survives across calls.
+    SDK retries are off: _create_completion_with_retry is the only retry policy.
+    """
+    return OpenAI(api_key=openai_key, max_retries=0)
+
+
 def generate_dimensions(reviews_sample, openai_key):
     """
     Analyzes a sample of reviews to suggest relevant analysis axes.
     """
-    client = OpenAI(api_key=openai_key)
+    client = get_openai_client(openai_key)
     
     # Format reviews for prompt
     reviews_text = "\n".join([f"- {r.get('text', '')}" for r in reviews_sample[:10]])
@@ -126,9 +487,17 @@ def generate_dimensions(reviews_sample, openai_key):
     - description: What this dimension covers
     - keywords: A list of 3-5 related keywords
     """
+
+    cache_key = _llm_cache_key(DIMENSIONS_PROMPT_VERSION, "gpt-4o-mini", reviews_text)
+    if LLM_CACHE_ENABLED:
+        cached = _llm_cache_get("dimensions", cache_key)
+        if cached:
+            logger.info("♻️ Using cached dimensions for this review sample")
+            return cached
     
     try:
-        completion = client.chat.completions.create(
+        completion = _create_completion_with_retry(
+            client,
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an expert Customer Experience (CX) taxonomy designer. Your task is to generate a set of 8-14 experience dimensions (topics) that are specifically relevant for analyzing customer reviews. Return ONLY JSON."},
@@ -137,18 +506,20 @@ def generate_dimensions(reviews_sample, openai_key):
             response_format={ "type": "json_object" }
         )
         content = completion.choices[0].message.content
-        data = json.loads(content)
+        data = json_utils.loads(content)
         
         # Handle if wrapped in a key like "dimensions" or just array
         if "dimensions" in data:
-            return data["dimensions"]
+            dimensions = data["dimensions"]
         elif isinstance(data, list):
-            return data
+            dimensions = data
         else:
             # Try to find array in values
-            for v in data.values():
-                if isinstance(v, list): return v
-            return []
+            dimensions = next((v for v in data.values() if isinstance(v, list)), [])
+
+        if dimensions and LLM_CACHE_ENABLED:
+            _llm_cache_put("dimensions", cache_key, dimensions)
+        return dimensions
             
     except Exception as e:
         logger.error(f"Error generating dimensions: {e}")
@@ -158,8 +529,21 @@ def analyze_reviews(file_path, dimensions, openai_key, portfolio_id, job_id=None
     """
     Reads CSV, batches reviews, and sends to OpenAI for sentiment/topic analysis.
     Merges results back into DataFrame and uploads to S3.
+    Any unexpected failure is written to the job status as a terminal "error"
+    before being re-raised, so the frontend stops polling.
     """
-    error = None
+    error_str = None
+    try:
+        return _run_analysis(file_path, dimensions, openai_key, portfolio_id, job_id, progress_callback)
+    except Exception as exc:
+        error_str = str(exc)
+        logger.error(f"❌ Analysis failed for {job_id}: {error_str}")
+        raise
+    finally:
+        if job_id and error_str:
+            update_analysis_status(job_id, "error", f"Analysis failed: {error_str}", error=error_str)
+
+def _run_analysis(file_path, dimensions, openai_key, portfolio_id, job_id, progress_callback):
     try:
         # Try loading from database first
         from database import Review, SessionLocal
@@ -196,7 +580,7 @@ def analyze_reviews(file_path, dimensions, openai_key, portfolio_id, job_id=None
             logger.info(f"Loading {len(db_reviews)} reviews from database for job {review_job_id}")
             df = pd.DataFrame([r.to_dict() for r in db_reviews])
         elif file_path and os.path.exists(file_path):
-            df = pd.read_csv(file_path)
+            df = _read_reviews_csv(file_path)
         else:
             if not file_path:
                 error_msg = f"Could not find reviews in DB for {review_job_id} and no file_path provided."
@@ -208,9 +592,9 @@ def analyze_reviews(file_path, dimensions, openai_key, portfolio_id, job_id=None
             # Assume file_path is S3 Key
             s3_bucket = os.getenv("S3_BUCKET_NAME", "horus-voc-data-storage-v2-eu")
             logger.info(f"Reading from S3: {file_path}")
-            s3 = boto3.client('s3', region_name=os.getenv("AWS_REGION", "eu-central-1"))
+            s3 = get_s3_client()
             obj = s3.get_object(Bucket=s3_bucket, Key=file_path)
-            df = pd.read_csv(obj['Body'])
+            df = _read_reviews_csv(io.BytesIO(obj['Body'].read()))
     except Exception as e:
         error_msg = f"Could not read file: {e}"
         logger.error(error_msg)
@@ -218,10 +602,10 @@ def analyze_reviews(file_path, dimensions, openai_key, portfolio_id, job_id=None
             update_analysis_status(job_id, "error", error_msg)
         return {"error": error_msg}
         
-    client = OpenAI(api_key=openai_key)
-    
-    # Analyze all reviews (removed limit for production/full analysis)
-    df_sample = df.copy()
+    # Analyze all reviews (removed limit for production/full analysis).
+    # Work on the loaded frame directly; a copy would double memory for large exports.
+    df_sample = df
+    total_rows = len(df)
     
     logger.info(f"Starting analysis for {len(df_sample)} reviews.")
     
@@ -232,9 +616,18 @@ def analyze_reviews(file_path, dimensions, openai_key, portfolio_id, job_id=None
     # --- RESUME LOGIC ---
     # Try to load existing progress
     analyzed_results = load_checkpoint(job_id)
+
+    # Everything up to here is already in S3; later checkpoints only upload what follows
+    last_saved_len = len(analyzed_results)
     
     # Create a set of processed indices for O(1) lookup
     processed_indices = {item['index'] for item in analyzed_results}
+
+    # Pick up results completed after the last S3 checkpoint
+    for item in load_local_checkpoint(job_id):
+        if item.get('index') not in processed_indices:
+            processed_indices.add(item['index'])
+            analyzed_results.append(item)
     
     if processed_indices:
         logger.info(f"Skipping {len(processed_indices)} already processed reviews.")
@@ -242,167 +635,228 @@ def analyze_reviews(file_path, dimensions, openai_key, portfolio_id, job_id=None
     
     # Prepare dimensions list for prompt
     dims_list = "\n".join([f"- {d['dimension']}" for d in dimensions])
+
+    # Fill the dimensions placeholder once; every request reuses the same prompt string
+    system_prompt = ANALYSIS_SYSTEM_PROMPT_TEMPLATE.replace("{dimensions}", dims_list)
+    system_message = {"role": "system", "content": system_prompt}
+
+    # Canonical dimension names for validating what the model returns
+    dim_names = {d['dimension'].casefold(): d['dimension'] for d in dimensions}
     
     # Process reviews concurrently for better performance
     total_reviews = len(df_sample)
-    logger.info(f"Processing {total_reviews} reviews concurrently...")
+    logger.info(f"Processing {total_reviews} reviews concurrently (up to {OPENAI_CONCURRENCY} requests in flight)...")
     
     import concurrent.futures
-    import threading
     
     processed_count = 0
-    count_lock = threading.Lock()
+    last_status_ts = 0.0
+
+    # Model answers to store in the LLM cache once the run finishes: (cache key, result)
+    fresh_cache_entries = []
     
-    def process_review(idx, row):
-        nonlocal processed_count
-        # Skip if already processed
-        if idx in processed_indices:
-            return None
+    # Status and checkpoint uploads run in the background, one at a time and in order,
+    # so the analysis loop never waits on S3
+    s3_write_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
 
-        review_text = row['text']
-        
-        # Build the detailed prompt
-        system_prompt = """You are an expert Customer Experience Analyst.
+    # Runs on the event loop thread only, so no lock is needed around the shared state
+    def record_results(batch_results):
+        nonlocal processed_count, last_saved_len, last_status_ts
+        for idx, result in batch_results:
+            # Store result with index
+            item = {
+                "index": idx,
+                "result": result
+            }
+            analyzed_results.append(item)
+            if checkpoint_file:
+                checkpoint_file.write(json_utils.dumps(item) + b"\n")
+        if checkpoint_file:
+            checkpoint_file.flush()
+        processed_count += len(batch_results)
+        review_num = processed_count
 
-Analyze the following customer review and extract:
-1. Multi-level sentiment analysis
-2. Structured experience dimensions (topics)
+        # Update progress at most every STATUS_UPDATE_INTERVAL seconds, or on the last one
+        now = time.monotonic()
+        if now - last_status_ts >= STATUS_UPDATE_INTERVAL or review_num == total_reviews:
+            last_status_ts = now
+            msg = f"Analyzing review {review_num}/{total_reviews}..."
+            logger.info(msg)
+            if job_id:
+                s3_write_executor.submit(update_analysis_status, job_id, "running", msg, review_num, total_reviews)
+            if progress_callback:
+                progress_callback(msg)
 
-Return ONLY valid JSON in this EXACT format with no additional text, no markdown formatting, no code blocks:
-{
-  "sentiment": "Positive",
-  "emotion": "Delighted",
-  "confidence": 0.95,
-  "topics": [
-    {
-      "dimension": "Dimension Name Here",
-      "sentiment": "Positive",
-      "mentioned": true
-    }
-  ]
-}
+        # Checkpoint every 50 reviews (only the results added since the last save)
+        saved_count = len(analyzed_results)
+        if job_id and saved_count // 50 > (saved_count - len(batch_results)) // 50:
+            delta = analyzed_results[last_saved_len:saved_count]
+            s3_write_executor.submit(save_checkpoint, job_id, delta, last_saved_len)
+            last_saved_len = saved_count
 
-SENTIMENT GUIDELINES:
-- Overall Sentiment: Choose ONLY: Positive, Neutral, or Negative
-- Emotional Tone: Choose ONLY from: Delighted, Satisfied, Frustrated, Disappointed, Angry, Surprised, Confused, or Indifferent
-- Confidence: A number between 0.00 and 1.00 (higher when language is explicit and clear)
+    async def request_analysis(client, sem, rate_limiter, batch):
+        """Sends one batch to the model; returns {batch-local id: result} for the reviews it answered."""
+        reviews_payload = [{"id": i, "text": review_text} for i, (_, review_text) in enumerate(batch)]
+        user_prompt = f"""Reviews:
+{json.dumps(reviews_payload, ensure_ascii=False)}
+"""
 
-Distinguish severity examples:
-- "A bit expensive" → sentiment: Negative, emotion: Disappointed, confidence: 0.70
-- "Worst service ever" → sentiment: Negative, emotion: Angry, confidence: 0.95
-- "Product was amazing" → sentiment: Positive, emotion: Delighted, confidence: 0.90
-- "It's okay" → sentiment: Neutral, emotion: Indifferent, confidence: 0.60
+        # Rough prompt size (~4 chars per token) plus headroom for the JSON response
+        estimated_tokens = (len(system_prompt) + len(user_prompt)) // 4 + 500
 
-TOPIC/DIMENSION GUIDELINES:
-Extract ONLY the experience dimensions that are explicitly mentioned in the review.
+        async with sem:
+            completion = await _acreate_completion_with_retry(
+                client,
+                rate_limiter=rate_limiter,
+                estimated_tokens=estimated_tokens,
+                model="gpt-4o-mini",
+                messages=[system_message, {"role": "user", "content": user_prompt}],
+                response_format={ "type": "json_object" }
+            )
+        content = completion.choices[0].message.content
+        data = json_utils.loads(content)
 
-Use ONLY these predefined dimensions (use exact names):
-{dimensions}
+        # Align results back to reviews by their batch-local id
+        results_by_id = {}
+        for item in data.get("results", []):
+            if isinstance(item, dict) and "id" in item:
+                item["topics"] = _canonicalize_topics(item.get("topics"), dim_names)
+                results_by_id[str(item.pop("id"))] = item
+        return results_by_id
 
-For each mentioned dimension:
-- Set "mentioned": true
-- Indicate sentiment for that specific dimension: Positive, Neutral, or Negative
-- Use the EXACT dimension name from the list above
+    async def process_batch(client, sem, rate_limiter, batch):
+        results_by_id = {}
+        throttled = False
+        try:
+            results_by_id = await request_analysis(client, sem, rate_limiter, batch)
+        except Exception as e:
+            # Reached only after retries are exhausted (or on a non-transient error)
+            logger.error(f"Error analyzing reviews {batch[0][0]}..{batch[-1][0]}: {e}")
+            throttled = isinstance(e, RETRYABLE_OPENAI_ERRORS)
 
-ONLY include dimensions that are clearly referenced in the review. If a dimension is not mentioned, do NOT include it in the topics array.
+        # Re-send unanswered reviews one at a time so a single bad row can't poison the whole batch.
+        # Not after exhausted transient errors: N more calls would only add to the throttling,
+        # so those reviews get the neutral result instead
+        missing = [i for i in range(len(batch)) if str(i) not in results_by_id]
+        if missing and len(batch) > 1 and not throttled:
+            logger.warning(f"Retrying {len(missing)} reviews from batch starting at {batch[0][0]} individually")
+            singles = await asyncio.gather(
+                *(request_analysis(client, sem, rate_limiter, [batch[i]]) for i in missing),
+                return_exceptions=True
+            )
+            for i, single in zip(missing, singles):
+                if isinstance(single, Exception):
+                    logger.error(f"Error analyzing review {batch[i][0]}: {single}")
+                elif "0" in single:
+                    results_by_id[str(i)] = single["0"]
 
-The review may contain English, Arabic, or both languages. Analyze accordingly.
+        batch_results = []
+        for i, (idx, _) in enumerate(batch):
+            result = results_by_id.get(str(i))
+            if result is None:
+                # Store empty result to maintain index alignment
+                result = dict(NEUTRAL_RESULT, topics=[])
+            elif LLM_CACHE_ENABLED:
+                fresh_cache_entries.append((cache_keys[idx], result))
+            batch_results.append((idx, result))
+        record_results(batch_results)
 
-Remember: Return ONLY the JSON object. No explanations, no markdown code blocks, no additional text."""
-        
-        user_prompt = f"""Review:
-"{review_text}"
-"""
-        
-        # Replace dimensions placeholder
-        system_prompt = system_prompt.replace("{dimensions}", dims_list)
-        
+    # Only the text column is needed. On resume, drop finished rows with one vectorized
+    # mask instead of a per-row membership test.
+    todo_texts = df_sample['text']
+    if processed_indices:
+        todo_texts = todo_texts[~todo_texts.index.isin(list(processed_indices))]
+
+    # Zip the raw index and text arrays instead of iterating rows.
+    # tolist() keeps indices as plain ints for the checkpoint JSON and result lookups.
+    pending = [
+        (idx, "" if pd.isna(review_text) else str(review_text))
+        for idx, review_text in zip(todo_texts.index.tolist(), todo_texts.to_numpy())
+    ]
+
+    checkpoint_file = None
+    if job_id:
         try:
-            completion = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format={ "type": "json_object" }
-            )
-            content = completion.choices[0].message.content
-            result = json.loads(content)
-            
-            with count_lock:
-                # Store result with index
-                analyzed_results.append({
-                    "index": idx,
-                    "result": result
-                })
-                processed_count += 1
-                review_num = processed_count
-                
-                # Update progress every 10 reviews or on last one
-                if review_num % 10 == 0 or review_num == total_reviews:
-                    msg = f"Analyzing review {review_num}/{total_reviews}..."
-                    logger.info(msg)
-                    if job_id:
-                        update_analysis_status(job_id, "running", msg, review_num, total_reviews)
-                    if progress_callback:
-                        progress_callback(msg)
-                
-                # Checkpoint every 50 reviews
-                if job_id and len(analyzed_results) > 0 and len(analyzed_results) % 50 == 0:
-                     save_checkpoint(job_id, analyzed_results)
-            
+            os.makedirs(LOCAL_CHECKPOINT_DIR, exist_ok=True)
+            checkpoint_file = open(get_local_checkpoint_path(job_id), 'ab')
         except Exception as e:
-            logger.error(f"Error analyzing review {idx}: {e}")
-            with count_lock:
-                # Store empty result to maintain index alignment
-                analyzed_results.append({
-                    "index": idx,
-                    "result": {
-                        "sentiment": "Neutral",
-                        "emotion": "Indifferent",
-                        "confidence": 0.0,
-                        "topics": []
-                    }
-                })
-                processed_count += 1
+            logger.warning(f"Local checkpointing disabled for {job_id}: {e}")
+
+    # Answer what we can from the LLM cache before calling OpenAI.
+    # Answers are grouped under a prefix per prompt version + dimensions (they shape the topics),
+    # so one listing of that prefix tells which reviews are cached and only those are fetched.
+    # Text is only stripped, not lowercased: case carries sentiment ("GREAT" vs "great").
+    cache_keys = {}
+    cache_kind = f"analysis/{_llm_cache_key(ANALYSIS_PROMPT_VERSION, 'gpt-4o-mini', dims_list)}"
+    if LLM_CACHE_ENABLED and pending:
+        cache_keys = {
+            idx: _llm_cache_key(ANALYSIS_PROMPT_VERSION, "gpt-4o-mini", dims_list, review_text.strip())
+            for idx, review_text in pending
+        }
+        existing = _llm_cache_list_keys(cache_kind)
+        to_fetch = [idx for idx, _ in pending if cache_keys[idx] in existing]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=LLM_CACHE_FETCH_WORKERS) as executor:
+            fetched = dict(zip(to_fetch, executor.map(lambda idx: _llm_cache_get(cache_kind, cache_keys[idx]), to_fetch)))
+        cached = [fetched.get(idx) for idx, _ in pending]
+        hits = [(idx, result) for (idx, _), result in zip(pending, cached) if result is not None]
+        if hits:
+            logger.info(f"♻️ {len(hits)} reviews answered from LLM cache")
+            record_results(hits)
+            pending = [item for item, result in zip(pending, cached) if result is None]
+
+    batches = [pending[i:i + ANALYSIS_BATCH_SIZE] for i in range(0, len(pending), ANALYSIS_BATCH_SIZE)]
 
     # Run concurrently
-    with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-        futures = [executor.submit(process_review, idx, row) for idx, row in df_sample.iterrows()]
-        concurrent.futures.wait(futures)
+
+    async def run_batches():
+        sem = asyncio.Semaphore(OPENAI_CONCURRENCY)
+        rate_limiter = AsyncRateLimiter(OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT)
+        # SDK retries off: every attempt must go through the rate limiter in _acreate_completion_with_retry
+        async with AsyncOpenAI(api_key=openai_key, max_retries=0) as client:
+            outcomes = await asyncio.gather(
+                *(process_batch(client, sem, rate_limiter, batch) for batch in batches),
+                return_exceptions=True
+            )
+        for batch, outcome in zip(batches, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"Batch starting at review {batch[0][0]} failed: {outcome}")
+
+    try:
+        asyncio.run(run_batches())
+    finally:
+        # Let queued status/checkpoint uploads land before the final status and cleanup
+        s3_write_executor.shutdown(wait=True)
+        if checkpoint_file:
+            checkpoint_file.close()
+
+    if fresh_cache_entries:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=LLM_CACHE_FETCH_WORKERS) as executor:
+            for key, result in fresh_cache_entries:
+                executor.submit(_llm_cache_put, cache_kind, key, result)
+        logger.info(f"💾 Cached {len(fresh_cache_entries)} new analysis results")
             
     # Merge results back into DataFrame
     logger.info("Merging analysis results into DataFrame...")
     
-    # Initialize new columns
-    df_sample['sentiment'] = None
-    df_sample['emotion'] = None
-    df_sample['confidence'] = None
-    df_sample['topics'] = None
-    
-    # Merge individual review results
-    for item in analyzed_results:
-        idx = item['index']
-        result = item['result']
-        
-        if idx in df_sample.index:
-            # Extract sentiment, emotion, and confidence
-            df_sample.at[idx, 'sentiment'] = result.get('sentiment', 'Neutral')
-            df_sample.at[idx, 'emotion'] = result.get('emotion', 'Indifferent')
-            df_sample.at[idx, 'confidence'] = result.get('confidence', 0.0)
-            
-            # Extract and format topics
-            topics_list = result.get('topics', [])
-            if topics_list:
-                # Format as: "Dimension1 (Positive), Dimension2 (Negative)"
-                topic_strings = [
-                    f"{topic.get('dimension', 'Unknown')} ({topic.get('sentiment', 'Neutral')})"
-                    for topic in topics_list
-                    if topic.get('mentioned', False)
-                ]
-                df_sample.at[idx, 'topics'] = '; '.join(topic_strings)
-            else:
-                df_sample.at[idx, 'topics'] = ''
+    # Build each output column as a list aligned with df_sample.index and assign them in one go;
+    # rows without a result stay empty
+    result_map = {item['index']: item['result'] for item in analyzed_results}
+    row_results = [result_map.get(idx) for idx in df_sample.index]
+
+    def format_topics(result):
+        # Format as: "Dimension1 (Positive), Dimension2 (Negative)"
+        return '; '.join(
+            f"{topic.get('dimension', 'Unknown')} ({topic.get('sentiment', 'Neutral')})"
+            for topic in result.get('topics') or []
+            if topic.get('mentioned', False)
+        )
+
+    df_sample = df_sample.assign(
+        sentiment=[r.get('sentiment', 'Neutral') if r is not None else None for r in row_results],
+        emotion=[r.get('emotion', 'Indifferent') if r is not None else None for r in row_results],
+        confidence=[r.get('confidence', 0.0) if r is not None else None for r in row_results],
+        topics=[format_topics(r) if r is not None else None for r in row_results],
+    )
     
     
     # Save AI analysis results back to database
@@ -434,9 +888,6 @@ Remember: Return ONLY the JSON object. No explanations, no markdown code blocks,
                 ).order_by(Review.id).all()
                 
                 if db_reviews:
-                    # Build a map from index to analysis result
-                    result_map = {item['index']: item['result'] for item in analyzed_results}
-                    
                     for i, review in enumerate(db_reviews):
                         if i in result_map:
                             result = result_map[i]
@@ -472,28 +923,25 @@ Remember: Return ONLY the JSON object. No explanations, no markdown code blocks,
     s3_key = None
     local_analyzed_path = None
 
-    # Final Status Update (Completed)
+    # Final Status Update (Completed) and checkpoint cleanup are independent S3 calls,
+    # so issue them concurrently (there is no email/upload step left to overlap with)
     if job_id:
-        update_analysis_status(
-            job_id, 
-            "completed", 
-            "Analysis complete!", 
-            len(df_sample), 
-            len(df_sample),
-            s3_key=s3_key,
-            s3_bucket=s3_bucket
-        )
-        
-        # Clean up checkpoint after successful completion
-        try:
-            s3_client = boto3.client('s3', region_name=os.getenv("AWS_REGION", "eu-central-1"))
-            s3_client.delete_object(Bucket=s3_bucket, Key=get_checkpoint_key(job_id))
-            logger.info(f"🧹 Removed checkpoint for {job_id} after success.")
-        except Exception as e:
-            logger.warning(f"Failed to delete checkpoint: {e}")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            executor.submit(
+                update_analysis_status,
+                job_id,
+                "completed",
+                "Analysis complete!",
+                len(df_sample),
+                len(df_sample),
+                s3_key=s3_key,
+                s3_bucket=s3_bucket
+            )
+            # Clean up checkpoint after successful completion
+            executor.submit(delete_checkpoint, job_id)
 
     return {
-        "total_reviews": len(df),
+        "total_reviews": total_rows,
         "analyzed_count": len(df_sample),
         "results": analyzed_results,
         "s3_bucket": s3_bucket,
@@ -5,13 +5,21 @@ API Documentation: https://docs.dataforseo.com/v3/serp/google/maps/
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import base64
 import os
+import random
+import re
+import threading
 import time
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
 from typing import List, Dict, Optional
-from functools import wraps
+from functools import wraps, lru_cache
+from services import json_utils
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,6 +30,15 @@ DATAFORSEO_LOGIN = os.getenv("DATAFORSEO_LOGIN")
 DATAFORSEO_PASSWORD = os.getenv("DATAFORSEO_PASSWORD")
 DATAFORSEO_BASE_URL = "https://api.dataforseo.com/v3"
 
+# One pooled session for all DataForSEO calls so polls reuse keep-alive TLS connections.
+# Retry covers idempotent GETs on throttling/5xx; task_post is not retried here to avoid duplicate tasks.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+))
+
 # Location codes for Middle East/GCC region
 # Get location codes from: https://api.dataforseo.com/v3/serp/google/locations
 LOCATION_CODES = {
@@ -45,9 +62,70 @@ PRIORITY_COUNTRIES = [
     "Oman",
 ]
 
+# Optional public URL of the pingback endpoint in main.py (e.g. https://api.example.com/api/dataforseo/pingback)
+# and the shared secret it checks. When both are set, DataForSEO calls it as soon as a task finishes,
+# and tasks_ready polling becomes a slow fallback.
+PINGBACK_CHECK_INTERVAL = 0.5  # seconds between local checks for received pingbacks
+PINGBACK_FALLBACK_POLL_WAIT = 10.0  # initial tasks_ready wait when pingbacks are enabled
+
+# Task ids an in-progress discovery is waiting on, and the subset DataForSEO has pinged back for.
+# Process-local: if the pingback lands on another worker, tasks_ready polling still picks the task up.
+_pingback_lock = threading.Lock()
+_pingback_watched = set()
+_pingback_ready = set()
+
+# In-process cache of parsed locations per (company, country). Maps listings change over days,
+# so repeat discoveries for the same company (UI retries, re-onboarding) skip DataForSEO entirely.
+DISCOVERY_CACHE_TTL = int(os.getenv("DISCOVERY_CACHE_TTL", "86400"))
+DISCOVERY_CACHE_MAX_ENTRIES = 1024
+_discovery_cache = {}  # (company_key, country) -> (stored_at, locations)
+_discovery_cache_lock = threading.Lock()
+
+# Discoveries currently running, keyed by normalized company name, so identical concurrent
+# requests share one run instead of each spending DataForSEO credits
+_inflight_discoveries = {}  # company_key -> Future
+_inflight_lock = threading.Lock()
+
+# DataForSEO status codes for throttling (per-minute limit / too many simultaneous requests)
+RATE_LIMIT_STATUS_CODES = {40202, 40209}
+
+# Generic words ignored when matching Maps titles against the company name
+COMPANY_NAME_STOPWORDS = frozenset({'the', 'and', 'inc', 'llc', 'ltd', 'co', 'corp', 'company', 'group', 'rent', 'car', 'rental'})
+
 # Configuration
 MAX_LOCATIONS_TARGET = 30  # Stop early if we reach this many locations
-DEFAULT_POLL_ATTEMPTS = 10  # Increased to give it ~1.5 minutes to process
+FIRST_WAVE_SIZE = 2  # Top PRIORITY_COUNTRIES searched before deciding whether the rest are needed
+DEFAULT_POLL_ATTEMPTS = 10  # tasks_ready checks, ~1.5 minutes of backoff before giving up
+# How long a coalesced discovery waits on the leader's run: both waves at the throttled poll cap
+# (15s) plus task_post/task_get time. Past this the leader is assumed hung and it runs its own
+COALESCED_WAIT_TIMEOUT = 2 * (DEFAULT_POLL_ATTEMPTS * 15.0 + 60.0)
+
+@dataclass(slots=True, frozen=True)
+class MapsLocation:
+    """
+    One discovered Google Maps location. Used internally (and in the discovery cache) instead of
+    per-result dicts; converted with to_dict() at the public API boundary.
+    Frozen so cached instances can be shared between discoveries safely.
+    """
+    place_id: str
+    name: str
+    url: str
+    address: str
+    rating: Optional[float]
+    reviews_count: Optional[int]
+    country: str = ""
+
+    def to_dict(self) -> Dict:
+        return {
+            "place_id": self.place_id,
+            "name": self.name,
+            "url": self.url,
+            "address": self.address,
+            "rating": self.rating,
+            "reviews_count": self.reviews_count,
+            "country": self.country,
+        }
+
 
 def _retry_on_failure(max_retries: int = 1, delay: float = 0.5):
     """Decorator to retry failed API calls with exponential backoff"""
@@ -71,27 +149,38 @@ def _retry_on_failure(max_retries: int = 1, delay: float = 0.5):
     return decorator
 
 
+@lru_cache(maxsize=4)
+def _build_auth_header(login: str, password: str) -> dict:
+    credentials = f"{login}:{password}"
+    encoded = base64.b64encode(credentials.encode()).decode()
+    return {
+        "Authorization": f"Basic {encoded}",
+        "Content-Type": "application/json"
+    }
+
+
 def _get_auth_header() -> dict:
-    """Generate Basic Auth header for DataForSEO API"""
+    """
+    Basic Auth header for DataForSEO API.
+    Credentials are still read from the environment on each call (they may be loaded
+    after import), but the encoded header dict is built once per credential pair.
+    Callers must not mutate the returned dict.
+    """
     login = os.getenv("DATAFORSEO_LOGIN")
     password = os.getenv("DATAFORSEO_PASSWORD")
     if not login or not password:
         logger.error("DataForSEO credentials missing in _get_auth_header")
         return {}
         
-    credentials = f"{login}:{password}"
-    encoded = base64.b64encode(credentials.encode()).decode()
-    return {
-        "Authorization": f"Basic {encoded}",
-        "Content-Type": "application/json"
-    }
+    return _build_auth_header(login, password)
 
 
 @_retry_on_failure(max_retries=1, delay=0.5)
-def _create_maps_search_task(keyword: str, location_code: int, depth: int = 100) -> Optional[str]:
+def _create_maps_search_tasks(keyword: str, locations: Dict[str, int], depth: int = 100) -> Dict[str, str]:
     """
-    Create a Google Maps SERP search task.
-    Returns task_id if successful, None otherwise.
+    Create one Google Maps SERP search task per location in a single task_post call.
+    `locations` maps a tag (country name) to its location code.
+    Returns {task_id: tag} for every task DataForSEO accepted.
     """
     url = f"{DATAFORSEO_BASE_URL}/serp/google/maps/task_post"
     
@@ -100,97 +189,207 @@ def _create_maps_search_task(keyword: str, location_code: int, depth: int = 100)
         "location_code": location_code,
         "language_code": "en",
         "depth": min(depth, 100),  # Max 100 for maps
-        "device": "desktop"
-    }]
+        "device": "desktop",
+        "tag": tag
+    } for tag, location_code in locations.items()]
+    
+    if pingback_enabled():
+        # DataForSEO substitutes $id with the task id when calling back
+        secret = urllib.parse.quote(os.getenv("DATAFORSEO_PINGBACK_SECRET"), safe="")
+        for task in payload:
+            task["pingback_url"] = f"{os.getenv('DATAFORSEO_PINGBACK_URL')}?secret={secret}&id=$id"
     
     try:
         # Reduced timeout to 30s to prevent hanging
-        response = requests.post(url, json=payload, headers=_get_auth_header(), timeout=30)
+        response = _SESSION.post(url, json=payload, headers=_get_auth_header(), timeout=30)
         response.raise_for_status()
-        result = response.json()
+        result = json_utils.loads(response.content)
         
+        created = {}
         if result.get("status_code") == 20000:
-            tasks = result.get("tasks", [])
-            if tasks and tasks[0].get("status_code") == 20100:
-                task_id = tasks[0].get("id")
-                logger.info(f"📍 Created search task: {task_id} for '{keyword}' in location {location_code}")
-                return task_id
+            for task in result.get("tasks") or []:
+                tag = (task.get("data") or {}).get("tag")
+                if task.get("status_code") == 20100 and task.get("id"):
+                    created[task["id"]] = tag
+                    logger.info(f"📍 Created search task: {task['id']} for '{keyword}' in {tag}")
+                else:
+                    logger.warning(f"Task creation failed for {tag}: {task.get('status_code')} - {task.get('status_message')}")
+            return created
         
         logger.error(f"Task creation failed: {result}")
-        return None
+        return {}
         
     except Exception as e:
-        logger.error(f"Error creating maps search task: {e}")
-        return None
+        logger.error(f"Error creating maps search tasks: {e}")
+        return {}
 
 
-def _poll_for_maps_results(task_id: str, max_attempts: int = DEFAULT_POLL_ATTEMPTS, initial_wait: float = 2.0) -> List[Dict]:
+@_retry_on_failure(max_retries=1, delay=0.5)
+def _search_maps_live(keyword: str, location_code: int, depth: int = 100) -> List[Dict]:
     """
-    Poll for Google Maps SERP task completion.
+    Run a Google Maps SERP search through the Live endpoint.
+    The response carries the results directly, so no task_get polling is needed.
     Returns list of location items or empty list.
     """
-    url = f"{DATAFORSEO_BASE_URL}/serp/google/maps/task_get/advanced/{task_id}"
+    url = f"{DATAFORSEO_BASE_URL}/serp/google/maps/live/advanced"
     
-    wait_time = initial_wait
+    payload = [{
+        "keyword": keyword,
+        "location_code": location_code,
+        "language_code": "en",
+        "depth": min(depth, 100),  # Max 100 for maps
+        "device": "desktop"
+    }]
     
-    for attempt in range(max_attempts):
-        time.sleep(wait_time)
+    try:
+        # Live requests block until the SERP is ready, so allow longer than task_post
+        response = _SESSION.post(url, json=payload, headers=_get_auth_header(), timeout=60)
+        response.raise_for_status()
+        result = json_utils.loads(response.content)
         
-        try:
-            # Short timeout for polling
-            response = requests.get(url, headers=_get_auth_header(), timeout=10)
-            result = response.json()
-            
-            tasks = result.get("tasks", [])
-            if not tasks:
-                continue
-                
-            task = tasks[0]
-            status_code = task.get("status_code")
-            
-            # 20000 = success
-            if status_code == 20000:
-                task_result = task.get("result") or []
-                if task_result:
-                    items = task_result[0].get("items") or []
-                    logger.info(f"Task {task_id}: Retrieved {len(items)} locations")
-                    return items
-                return []
-            
-            # Task still processing
-            elif status_code in [40601, 40602]:
-                logger.info(f"Task {task_id}: Processing (attempt {attempt + 1}/{max_attempts})")
-                wait_time = min(wait_time * 1.5, 10.0) # Cap wait time at 10s
-            
-            # No results found
-            elif status_code == 40102:
-                logger.warning(f"Task {task_id}: No results found")
-                return []
-                
-            else:
-                logger.warning(f"Task {task_id}: Status {status_code} - {task.get('status_message')}")
-                wait_time = min(wait_time * 1.5, 10.0)
-                
-        except Exception as e:
-            logger.error(f"Error polling task {task_id}: {e}")
-            # Don't break immediately on network error, try one more time if attempts allow
+        tasks = result.get("tasks", [])
+        if not tasks:
+            logger.error(f"Live search returned no tasks: {result}")
+            return []
+        
+        task = tasks[0]
+        status_code = task.get("status_code")
+        if status_code == 20000:
+            task_result = task.get("result") or []
+            items = (task_result[0].get("items") or []) if task_result else []
+            logger.info(f"📍 Live search for '{keyword}' in location {location_code}: {len(items)} items")
+            return items
+        
+        if status_code == 40102:
+            logger.warning(f"Live search for '{keyword}' in location {location_code}: No results found")
+        else:
+            logger.warning(f"Live search status {status_code} - {task.get('status_message')}")
+        return []
+        
+    except requests.RequestException:
+        raise
+    except Exception as e:
+        logger.error(f"Error running live maps search: {e}")
+        return []
+
+
+def _get_ready_task_ids() -> set:
+    """
+    One call to tasks_ready lists every finished-but-uncollected Maps task on the account,
+    so a single GET covers all outstanding countries instead of one task_get poll each.
+    """
+    url = f"{DATAFORSEO_BASE_URL}/serp/google/maps/tasks_ready"
+    response = _SESSION.get(url, headers=_get_auth_header(), timeout=10)
+    response.raise_for_status()
+    result = json_utils.loads(response.content)
+    if result.get("status_code") in RATE_LIMIT_STATUS_CODES:
+        raise requests.HTTPError(f"DataForSEO rate limit: {result.get('status_message')}", response=response)
     
-    logger.warning(f"Task {task_id}: Timeout after {max_attempts} attempts")
-    return []
+    ready = set()
+    for task in result.get("tasks") or []:
+        for entry in task.get("result") or []:
+            if entry.get("id"):
+                ready.add(entry["id"])
+    return ready
+
+
+def pingback_enabled() -> bool:
+    """Pingbacks are only requested with a secret, so the public endpoint can reject forged calls."""
+    return bool(os.getenv("DATAFORSEO_PINGBACK_URL") and os.getenv("DATAFORSEO_PINGBACK_SECRET"))
 
 
-def _parse_maps_items(items: List[Dict], company_name: str) -> List[Dict]:
+def notify_task_ready(task_id: str) -> bool:
     """
-    Parse DataForSEO Google Maps SERP items into normalized location objects.
-    Filters to only include results that match the company name.
+    Record a DataForSEO pingback for a finished task.
+    Returns False if no discovery in this process is waiting on that task.
     """
-    locations = []
+    with _pingback_lock:
+        if task_id not in _pingback_watched:
+            return False
+        _pingback_ready.add(task_id)
+        return True
+
+
+def _take_pinged_task_ids(task_ids) -> set:
+    with _pingback_lock:
+        pinged = _pingback_ready.intersection(task_ids)
+        _pingback_ready.difference_update(pinged)
+        return pinged
+
+
+def _discovery_cache_get(company_name: str, country: str) -> Optional[List[MapsLocation]]:
+    key = (company_name.strip().lower(), country)
+    with _discovery_cache_lock:
+        entry = _discovery_cache.get(key)
+        if entry is None:
+            return None
+        stored_at, locations = entry
+        if time.monotonic() - stored_at > DISCOVERY_CACHE_TTL:
+            del _discovery_cache[key]
+            return None
+    return locations
+
+
+def _discovery_cache_put(company_name: str, country: str, locations: List[MapsLocation]):
+    key = (company_name.strip().lower(), country)
+    with _discovery_cache_lock:
+        _discovery_cache.pop(key, None)
+        _discovery_cache[key] = (time.monotonic(), list(locations))
+        # Dicts keep insertion order, so the first key is the oldest entry
+        while len(_discovery_cache) > DISCOVERY_CACHE_MAX_ENTRIES:
+            del _discovery_cache[next(iter(_discovery_cache))]
+
+
+def _fetch_maps_results(task_id: str) -> List[Dict]:
+    """
+    Fetch the results of a finished Google Maps SERP task.
+    Returns list of location items or empty list.
+    """
+    url = f"{DATAFORSEO_BASE_URL}/serp/google/maps/task_get/advanced/{task_id}"
     
+    try:
+        response = _SESSION.get(url, headers=_get_auth_header(), timeout=10)
+        result = json_utils.loads(response.content)
+        
+        tasks = result.get("tasks") or []
+        if not tasks:
+            logger.warning(f"Task {task_id}: Empty task_get response")
+            return []
+            
+        task = tasks[0]
+        status_code = task.get("status_code")
+        
+        # 20000 = success
+        if status_code == 20000:
+            task_result = task.get("result") or []
+            if task_result:
+                items = task_result[0].get("items") or []
+                logger.info(f"Task {task_id}: Retrieved {len(items)} locations")
+                return items
+            return []
+        
+        # No results found
+        if status_code == 40102:
+            logger.warning(f"Task {task_id}: No results found")
+        else:
+            logger.warning(f"Task {task_id}: Status {status_code} - {task.get('status_message')}")
+        return []
+            
+    except Exception as e:
+        logger.error(f"Error fetching task {task_id}: {e}")
+        return []
+
+
+@lru_cache(maxsize=128)
+def _build_keyword_matcher(company_name: str) -> Optional["re.Pattern"]:
+    """
+    Compile the company-name keyword filter once per company (shared by every country's parse).
+    Returns None when the name yields no usable keywords.
+    """
     # Extract significant words from company name (min 3 chars, ignore common words)
-    stopwords = {'the', 'and', 'inc', 'llc', 'ltd', 'co', 'corp', 'company', 'group', 'rent', 'car', 'rental'}
     company_words = [
-        word.lower() for word in company_name.split() 
-        if len(word) >= 3 and word.lower() not in stopwords
+        word_lower for word in company_name.split() 
+        if len(word) >= 3 and (word_lower := word.lower()) not in COMPANY_NAME_STOPWORDS
     ]
     
     # If no significant words found, use first word as fallback
@@ -201,47 +400,61 @@ def _parse_maps_items(items: List[Dict], company_name: str) -> List[Dict]:
     
     logger.info(f"Filtering results using keywords: {company_words}")
     
+    # No keywords means nothing can match (an empty alternation would match everything)
+    if not company_words:
+        return None
+    
+    # One alternation scanned by the regex engine in a single pass per title,
+    # instead of a Python-level substring loop per word. IGNORECASE lets titles be
+    # searched as-is, without building a lowercased copy of each one.
+    return re.compile("|".join(re.escape(word) for word in company_words), re.IGNORECASE)
+
+
+def _parse_maps_items(items: List[Dict], keyword_pattern: Optional["re.Pattern"], country: str = "") -> List[MapsLocation]:
+    """
+    Parse DataForSEO Google Maps SERP items into MapsLocation objects tagged with country.
+    Filters to only include results whose title matches keyword_pattern
+    (from _build_keyword_matcher, computed once per discovery by the caller).
+    """
+    locations = []
+    
+    if keyword_pattern is None:
+        logger.info("Filtered to 0 matching locations")
+        return locations
+    
+    # Bind hot-loop lookups to locals
+    search = keyword_pattern.search
+    append = locations.append
+    
     for item in items:
-        if item.get("type") != "maps_search":
+        get = item.get
+        
+        # Cheap checks first: wrong type or no place_id (required for reviews)
+        if get("type") != "maps_search":
+            continue
+        place_id = get("place_id")
+        if not place_id:
             continue
             
-        title = item.get("title", "") or ""
-        title_lower = title.lower()
+        title = get("title") or ""
         
         # Filter: check if ANY significant word from company name appears in title
         # This handles cases like "Budget Saudi" matching "Budget Rent A Car"
-        matches = any(word in title_lower for word in company_words)
-        if not matches:
+        if not search(title):
             continue
         
-        place_id = item.get("place_id", "") or ""
-        address = item.get("address", "") or ""
-        
-        # Skip if no place_id (required for reviews)
-        if not place_id:
-            continue
-        
-        # Generate proper Google Maps URL from place_id
-        # This ensures we always have a working Maps link, not a website URL
-        maps_url = f"https://www.google.com/maps/place/?q=place_id:{place_id}"
-        
-        if "Calo" in title:
-            # logger.info(f"Full Item for {title}: {item}")
-            pass
-
-        # Debug rating extraction
-        rating_obj = item.get("rating", {})
-        # if rating_obj:
-        #     logger.info(f"Rating Object for {title}: {rating_obj}")
-
-        locations.append({
-            "place_id": place_id,
-            "name": title,
-            "url": maps_url,  # Always use generated Maps URL
-            "address": address,
-            "rating": item.get("rating", {}).get("value") if item.get("rating") else None,
-            "reviews_count": int(item.get("rating", {}).get("votes_count") or 0) if item.get("rating") else None,
-        })
+        rating = get("rating")
+
+        append(MapsLocation(
+            place_id=place_id,
+            name=title,
+            # Always use a Maps URL generated from place_id, never the business website
+            url=f"https://www.google.com/maps/place/?q=place_id:{place_id}",
+            address=get("address") or "",
+            rating=rating.get("value") if rating else None,
+            reviews_count=int(rating.get("votes_count") or 0) if rating else None,
+            country=country,
+        ))
     
     logger.info(f"Filtered to {len(locations)} matching locations")
     return locations
@@ -265,6 +478,38 @@ def discover_maps_links(company_name: str, website: str,
     Returns:
         List of location dicts with: place_id, name, url, address, rating, reviews_count
     """
+    # Coalesce concurrent discoveries for the same company onto one DataForSEO run
+    key = company_name.strip().lower()
+    with _inflight_lock:
+        future = _inflight_discoveries.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _inflight_discoveries[key] = future
+    
+    if not is_leader:
+        logger.info(f"⏳ Discovery for '{company_name}' already in progress, waiting for its results")
+        if progress_callback:
+            progress_callback(f"Waiting for ongoing discovery of '{company_name}'...")
+        try:
+            return [loc.to_dict() for loc in future.result(timeout=COALESCED_WAIT_TIMEOUT)]
+        except FutureTimeoutError:
+            logger.warning(f"Ongoing discovery for '{company_name}' still running after {COALESCED_WAIT_TIMEOUT:.0f}s, running a separate one")
+            return [loc.to_dict() for loc in _run_discovery(company_name, progress_callback)]
+    
+    try:
+        locations = _run_discovery(company_name, progress_callback)
+        future.set_result(locations)
+        return [loc.to_dict() for loc in locations]
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight_discoveries.pop(key, None)
+
+
+def _run_discovery(company_name: str, progress_callback=None) -> List[MapsLocation]:
     # Load credentials dynamically to ensure they are available
     login = os.getenv("DATAFORSEO_LOGIN")
     password = os.getenv("DATAFORSEO_PASSWORD")
@@ -275,6 +520,12 @@ def discover_maps_links(company_name: str, website: str,
             progress_callback("Error: Server configuration missing credentials")
         return []
     
+    # Build the title filter once for every country; a name with no usable keywords can't match anything
+    keyword_pattern = _build_keyword_matcher(company_name)
+    if keyword_pattern is None:
+        logger.warning(f"No usable keywords in company name '{company_name}', skipping discovery")
+        return []
+    
     logger.info(f"🔍 DataForSEO Maps Discovery: Searching for '{company_name}' across GCC/MENA region...")
     if progress_callback:
         progress_callback(f"Starting discovery for '{company_name}'...")
@@ -282,31 +533,16 @@ def discover_maps_links(company_name: str, website: str,
     all_locations = []
     seen_place_ids = set()
     
-    # Search across multiple countries in priority order
-    def search_country(country_name: str, location_code: int):
-        """Search for company in a specific country"""
-        if progress_callback:
-            progress_callback(f"Searching in {country_name}...")
-            
+    # Fetch and parse one finished country task
+    def search_country(country_name: str, task_id: str):
+        """Collect results for company in a specific country"""
         try:
-            # We need to pass credentials to helper functions or ensure they use os.getenv too?
-            # actually _create_maps_search_task uses global DATAFORSEO_LOGIN/PASSWORD
-            # Let's verify _create_maps_search_task uses updated values or refresh them there too.
-            # Ideally we refactor helpers to take credentials, but for now we rely on os.getenv in helpers
-            # IF we update the globals or just trust os.getenv works globally if loaded.
-            
-            task_id = _create_maps_search_task(company_name, location_code, depth=50)
-            if not task_id:
-                logger.warning(f"Failed to create task for {country_name}")
-                return []
-            
-            # Use optimized polling attempts
-            items = _poll_for_maps_results(task_id, max_attempts=DEFAULT_POLL_ATTEMPTS)
-            locations = _parse_maps_items(items, company_name)
+            items = _fetch_maps_results(task_id)
+            locations = _parse_maps_items(items, keyword_pattern, country_name)
             
-            # Add country info
-            for loc in locations:
-                loc["country"] = country_name
+            # Only cache non-empty answers: an empty list may also mean a failed fetch
+            if locations:
+                _discovery_cache_put(company_name, country_name, locations)
                 
             return locations
         except Exception as e:
@@ -314,40 +550,138 @@ def discover_maps_links(company_name: str, website: str,
             return []
     
     # Use priority-ordered countries for better early termination
-    ordered_countries = [
-        (country, LOCATION_CODES[country]) 
+    ordered_countries = {
+        country: LOCATION_CODES[country]
         for country in PRIORITY_COUNTRIES 
         if country in LOCATION_CODES
-    ]
+    }
     
-    # Run searches in parallel (max 10 concurrent to cover all countries at once)
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {
-            executor.submit(search_country, country, code): country 
-            for country, code in ordered_countries
-        }
+    # Runs only on the coordinating thread, so deduplication needs no lock
+    def merge(country: str, locations: List[MapsLocation]):
+        for loc in locations:
+            if loc.place_id not in seen_place_ids:
+                seen_place_ids.add(loc.place_id)
+                all_locations.append(loc)
+                if len(all_locations) <= 20:
+                    logger.info(f"  ✓ {loc.name} ({country})")
+    
+    # Serve countries searched recently from the cache; only the rest go to DataForSEO
+    to_search = {}
+    for country, code in ordered_countries.items():
+        cached = _discovery_cache_get(company_name, country)
+        if cached is not None:
+            logger.info(f"♻️ Using cached locations for '{company_name}' in {country}")
+            merge(country, cached)
+        else:
+            to_search[country] = code
+    
+    def run_wave(countries: Dict[str, int]):
+        """Create the wave's tasks in one task_post call and collect them as they finish."""
+        if progress_callback:
+            progress_callback(f"Searching in {', '.join(countries)}...")
+        pending = _create_maps_search_tasks(company_name, countries, depth=50)
+        if not pending:
+            logger.warning(f"Failed to create discovery tasks for: {', '.join(countries)}")
+            return
+        
+        use_pingback = pingback_enabled()
+        task_ids = list(pending)
+        if use_pingback:
+            with _pingback_lock:
+                _pingback_watched.update(task_ids)
+    
+        # Poll tasks_ready once per tick for all outstanding tasks (or take pingbacks as they arrive)
+        # and hand each finished task to a worker for task_get + parsing; meanwhile merge whatever
+        # workers have completed.
+        # Not a `with` block: on early termination we return without waiting for in-flight fetches
+        executor = ThreadPoolExecutor(max_workers=max(len(pending), 1))
+        futures = {}
+        try:
+            wait_time = PINGBACK_FALLBACK_POLL_WAIT if use_pingback else 2.0
+            polls = 0
+            next_poll = time.monotonic() + wait_time
+    
+            def dispatch(ready_ids):
+                for task_id in ready_ids & pending.keys():
+                    country = pending.pop(task_id)
+                    if progress_callback:
+                        progress_callback(f"Searching in {country}...")
+                    futures[executor.submit(search_country, country, task_id)] = country
+    
+            while (pending or futures) and len(all_locations) < MAX_LOCATIONS_TARGET:
+                timeout = max(next_poll - time.monotonic(), 0) if pending else None
+                if use_pingback and pending:
+                    timeout = min(timeout, PINGBACK_CHECK_INTERVAL)
+                if futures:
+                    done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    time.sleep(timeout)
+                    done = set()
+        
+                for future in done:
+                    country = futures.pop(future)
+                    try:
+                        merge(country, future.result())
+                    except Exception as e:
+                        logger.error(f"Error processing results from {country}: {e}")
         
-        for future in as_completed(futures):
-            country = futures[future]
-            try:
-                locations = future.result()
-                for loc in locations:
-                    if loc["place_id"] not in seen_place_ids:
-                        seen_place_ids.add(loc["place_id"])
-                        all_locations.append(loc)
-                        if len(all_locations) <= 20:
-                            logger.info(f"  ✓ {loc['name']} ({country})")
-                
                 # Early termination: stop if we have enough quality results
                 if len(all_locations) >= MAX_LOCATIONS_TARGET:
                     logger.info(f"🎯 Reached target of {MAX_LOCATIONS_TARGET} locations, stopping early")
                     break
-                    
-            except Exception as e:
-                logger.error(f"Error processing results from {country}: {e}")
+        
+                if use_pingback and pending:
+                    dispatch(_take_pinged_task_ids(pending.keys()))
+        
+                if pending and time.monotonic() >= next_poll:
+                    polls += 1
+                    throttled = False
+                    try:
+                        ready = _get_ready_task_ids()
+                    except Exception as e:
+                        logger.error(f"Error polling tasks_ready: {e}")
+                        ready = set()
+                        # Throttling and 5xx (already retried by the session) both mean: back off harder
+                        throttled = True
+            
+                    dispatch(ready)
+            
+                    if pending:
+                        if polls >= DEFAULT_POLL_ATTEMPTS:
+                            logger.warning(f"Timeout after {polls} polls waiting for: {', '.join(pending.values())}")
+                            pending = {}
+                        else:
+                            logger.info(f"Waiting on {len(pending)} tasks (poll {polls}/{DEFAULT_POLL_ATTEMPTS})")
+                            if throttled:
+                                wait_time = min(wait_time * 2, 15.0)
+                            else:
+                                wait_time = min(wait_time * 1.5, 10.0) # Cap wait time at 10s
+                            # Jitter so concurrent discovery jobs don't poll in lockstep
+                            next_poll = time.monotonic() + wait_time * random.uniform(0.8, 1.2)
+        finally:
+            # Drop work for countries we no longer need (no-op when everything finished)
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+            if use_pingback:
+                with _pingback_lock:
+                    _pingback_watched.difference_update(task_ids)
+                    _pingback_ready.difference_update(task_ids)
+
+    # Two waves: the top markets usually satisfy MAX_LOCATIONS_TARGET on their own, so the
+    # remaining countries are only searched (and paid for) when they don't
+    to_search_list = list(to_search.items())
+    waves = [dict(to_search_list[:FIRST_WAVE_SIZE]), dict(to_search_list[FIRST_WAVE_SIZE:])]
+    for wave in waves:
+        if not wave:
+            continue
+        if len(all_locations) >= MAX_LOCATIONS_TARGET:
+            logger.info(f"🎯 Reached target of {MAX_LOCATIONS_TARGET} locations, skipping: {', '.join(wave)}")
+            break
+        run_wave(wave)
     
     # Sort by reviews count (most reviewed first)
-    all_locations.sort(key=lambda x: x.get("reviews_count") or 0, reverse=True)
+    all_locations.sort(key=lambda x: x.reviews_count or 0, reverse=True)
     
     logger.info(f"✅ DataForSEO Maps Discovery: Found {len(all_locations)} unique locations for '{company_name}'")
     
@@ -358,6 +692,7 @@ def discover_maps_links_single_country(company_name: str, country: str = "Saudi
                                          depth: int = 50) -> List[Dict]:
     """
     Discover locations in a single country (faster, cheaper option).
+    Not called by the API, which uses discover_maps_links (task_post + tasks_ready polling).
     
     Args:
         company_name: Name of the company to search for
@@ -374,15 +709,14 @@ def discover_maps_links_single_country(company_name: str, country: str = "Saudi
     
     logger.info(f"🔍 Searching for '{company_name}' in {country}...")
     
-    task_id = _create_maps_search_task(company_name, location_code, depth)
-    if not task_id:
+    # Single-country lookups are interactive, so use the Live endpoint (one request, no polling)
+    try:
+        items = _search_maps_live(company_name, location_code, depth)
+    except Exception as e:
+        logger.error(f"Error searching {country}: {e}")
         return []
     
-    items = _poll_for_maps_results(task_id)
-    locations = _parse_maps_items(items, company_name)
-    
-    for loc in locations:
-        loc["country"] = country
+    locations = _parse_maps_items(items, _build_keyword_matcher(company_name), country)
     
     logger.info(f"✅ Found {len(locations)} locations in {country}")
-    return locations
+    return [loc.to_dict() for loc in locations]
@@ -0,0 +1,64 @@
+"""
+Small persistent key/value cache with a TTL, for results that are slow to
+recompute and rarely change (e.g. app IDs scraped from company websites).
+
+Backed by one sqlite file per cache in the backend data directory. sqlite's
+file locking makes it safe for several uvicorn workers to share a cache; within
+a process, each cache keeps a single connection guarded by a lock.
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+
+
+class DiskCache:
+    def __init__(self, name: str, ttl_seconds: float):
+        self.path = os.path.join(CACHE_DIR, f"{name}_cache.sqlite3")
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self, create: bool):
+        """Opens the connection on first use (so importing never touches disk). Caller holds the lock."""
+        if self._conn is None:
+            if not create and not os.path.exists(self.path):
+                return None
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, t REAL NOT NULL, v BLOB NOT NULL)")
+            # Expired rows are only skipped on read, so drop them once per process
+            conn.execute("DELETE FROM cache WHERE t < ?", (time.time() - self.ttl_seconds,))
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str):
+        """Returns the cached value, or None if missing, expired or unreadable."""
+        try:
+            with self._lock:
+                conn = self._connect(create=False)
+                row = conn.execute("SELECT t, v FROM cache WHERE key = ?", (key,)).fetchone() if conn else None
+            if row is None or time.time() - row[0] > self.ttl_seconds:
+                return None
+            return pickle.loads(row[1])
+        except Exception as e:
+            logger.warning(f"⚠️ Disk cache read failed for {self.path}: {e}")
+            return None
+
+    def set(self, key: str, value) -> None:
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            with self._lock:
+                self._connect(create=True).execute(
+                    "INSERT OR REPLACE INTO cache (key, t, v) VALUES (?, ?, ?)", (key, time.time(), blob)
+                )
+        except Exception as e:
+            logger.warning(f"⚠️ Disk cache write failed for {self.path}: {e}")
@@ -1,8 +1,9 @@
 import smtplib
+import socket
 import os
 import logging
+import threading
 from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -17,17 +18,60 @@ MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
 MAIL_SERVER = "smtp.gmail.com"  # Assuming Gmail based on password format in .env
 MAIL_PORT = 587
 
+# One authenticated SMTP connection reused across sends (STARTTLS + login dominate the cost
+# of a single email). Guarded by a lock since smtplib connections are not thread-safe.
+_smtp = None
+_smtp_lock = threading.Lock()
+
+
+def _connect_smtp():
+    server = smtplib.SMTP(MAIL_SERVER, MAIL_PORT, timeout=30)
+    server.starttls()
+    server.login(MAIL_USERNAME, MAIL_PASSWORD)
+    return server
+
+
+def _close_smtp():
+    global _smtp
+    if _smtp is not None:
+        try:
+            _smtp.quit()
+        except Exception:
+            pass
+    _smtp = None
+
+
+def _get_smtp():
+    """Returns a live SMTP connection, reconnecting if the server dropped the idle one. Call with _smtp_lock held."""
+    global _smtp
+    if _smtp is not None:
+        try:
+            if _smtp.noop()[0] == 250:
+                return _smtp
+        except (smtplib.SMTPException, OSError):
+            pass
+        _close_smtp()
+    _smtp = _connect_smtp()
+    return _smtp
+
+
+def _send_message(msg):
+    with _smtp_lock:
+        try:
+            _get_smtp().send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout):
+            # Connection died between the NOOP and the send; retry once on a fresh one.
+            # Not for other SMTPExceptions (refused recipients, data errors): the server may
+            # already have accepted the message, and a resend would duplicate it
+            _close_smtp()
+            _get_smtp().send_message(msg)
+
 def send_invitation_email(recipient_email: str, portfolio_name: str, invite_link: str):
     """Sends an invitation email using SMTP."""
     if not MAIL_USERNAME or not MAIL_PASSWORD:
         logger.error("❌ Email credentials missing in environment variables")
         return False
 
-    msg = MIMEMultipart()
-    msg['From'] = MAIL_USERNAME
-    msg['To'] = recipient_email
-    msg['Subject'] = f"Invitation to join Portfolio: {portfolio_name}"
-
     body = f"""
     <html>
     <body>
@@ -43,14 +87,15 @@ def send_invitation_email(recipient_email: str, portfolio_name: str, invite_link
     </body>
     </html>
     """
-    msg.attach(MIMEText(body, 'html'))
+
+    # Single HTML body, so no multipart container is needed
+    msg = MIMEText(body, 'html')
+    msg['From'] = MAIL_USERNAME
+    msg['To'] = recipient_email
+    msg['Subject'] = f"Invitation to join Portfolio: {portfolio_name}"
 
     try:
-        server = smtplib.SMTP(MAIL_SERVER, MAIL_PORT)
-        server.starttls()
-        server.login(MAIL_USERNAME, MAIL_PASSWORD)
-        server.send_message(msg)
-        server.quit()
+        _send_message(msg)
         logger.info(f"✅ Invitation email sent to {recipient_email}")
         return True
     except Exception as e:
@@ -1,14 +1,106 @@
 import logging
 import concurrent.futures
+import os
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import re
+import html
 from urllib.parse import unquote
 
+from services.disk_cache import DiskCache
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# href of every <a> tag, and the Apple Smart App Banner meta tag
+_ANCHOR_HREF_RE = re.compile(r'<a\b[^>]*?\bhref\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+_ITUNES_META_RE = re.compile(r'<meta\b[^>]*apple-itunes-app[^>]*>', re.IGNORECASE)
+
+# App id patterns, compiled once instead of per anchor/redirect
+_ITUNES_APP_ID_RE = re.compile(r'app-id=(\d+)')
+_PLAY_ID_RE = re.compile(r'id=([a-zA-Z0-9_.]+)')
+_APPLE_ID_RE = re.compile(r'id(\d+)')
+_PLAY_URL_RE = re.compile(r'play\.google\.com/store/apps/details\?id=([a-zA-Z0-9_.]+)')
+_APPLE_URL_RE = re.compile(r'(?:apps|itunes)\.apple\.com(?:/[a-z]{2})?/app(?:/[^/]+)?/id(\d+)')
+_ANDROID_PARAM_RE = re.compile(r'(?:id|package|android_id|pkg)=([a-zA-Z0-9_.]+)')
+_APPLE_PARAM_RE = re.compile(r'(?:id|apple_id|ios_id)=(\d{9,12})')
+_APPLE_BARE_ID_RE = re.compile(r'id(\d{9,12})')
+_PACKAGE_NAME_RE = re.compile(r'^[a-z][a-z0-9_]*\.[a-z][a-z0-9_]*(\.[a-z][a-z0-9_.]*)*$')
+
+# App-link trackers/redirectors worth following to the store
+_REDIRECT_DOMAINS = (
+    'go.link', 'onelink.me', 'page.link', 'app.link', 'adjust.com',
+    'appsflyer.com', 'adj.st', 'link.me', 'smart.link', 'branch.io'
+)
+_STORE_LINK_MARKERS = ('play.google.com', 'apps.apple.com', 'itunes.apple.com', 'apple-itunes-app') + _REDIRECT_DOMAINS
+
+# Byte-level store link markers used while streaming the page
+STREAM_CHUNK_SIZE = 8192
+STORE_LINK_OVERLAP = 256
+_PLAY_URL_BYTES_RE = re.compile(rb'play\.google\.com/store/apps/details\?id=[a-zA-Z0-9_.]+')
+_APPLE_URL_BYTES_RE = re.compile(rb'(?:apps|itunes)\.apple\.com(?:/[a-z]{2})?/app(?:/[^/]+)?/id\d+')
+
+# Deep fallback patterns over the raw HTML/Scripts/JSON, in priority order
+_ANDROID_DEEP_PATTERNS = (
+    _PLAY_URL_RE,
+    re.compile(r'"(?:package|appId|packageId|androidId|android_id)":\s*"([a-zA-Z0-9_.]+)"'),
+    re.compile(r'package=([a-zA-Z0-9_.]+)'),
+    _PLAY_ID_RE, # Generic id= pattern for some trackers
+    re.compile(r'com\.[a-zA-Z0-9_]+\.[a-zA-Z0-9_.]+'), # Broad package pattern
+    re.compile(r'[a-zA-Z0-9_.]+\.[a-zA-Z0-9_.]+\.[a-zA-Z0-9_.]+'),
+)
+_APPLE_DEEP_PATTERNS = (
+    _APPLE_URL_RE,
+    re.compile(r'"(?:appleId|iosId|trackId|itunesId|apple_id|ios_id)":\s*"?(\d+)"?'),
+    _APPLE_BARE_ID_RE,
+    re.compile(r'apple-itunes-app.*?content=".*?app-id=(\d+)'),
+)
+
+# Scraping is network-bound, so run many companies at once; the headless browser
+# fallback is memory-heavy and gets its own, much smaller limit
+RESOLVE_WORKERS = int(os.getenv("APP_ID_RESOLVE_WORKERS", "16"))
+_BROWSER_SLOTS = threading.BoundedSemaphore(int(os.getenv("APP_ID_BROWSER_CONCURRENCY", "3")))
+
+# Shared across companies and threads so page fetches and redirect probes reuse pooled
+# keep-alive connections (headers are still passed per request)
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=2, backoff_factor=0.3)
+))
+
+def _read_html(response):
+    """
+    Reads a streamed page body, stopping as soon as complete direct links to both
+    stores have arrived; heavy homepages usually link the stores well before the
+    end of their inlined JS.
+    """
+    buf = bytearray()
+    has_play = has_apple = False
+    try:
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            # Re-scan a little of the previous chunk in case a link straddles the boundary
+            scan_from = max(0, len(buf) - STORE_LINK_OVERLAP)
+            buf.extend(chunk)
+            # A match touching the end of the buffer may be cut mid-id, so it doesn't count yet
+            if not has_play:
+                m = _PLAY_URL_BYTES_RE.search(buf, scan_from)
+                has_play = m is not None and m.end() < len(buf)
+            if not has_apple:
+                m = _APPLE_URL_BYTES_RE.search(buf, scan_from)
+                has_apple = m is not None and m.end() < len(buf)
+            if has_play and has_apple:
+                break
+    finally:
+        response.close()
+    return buf.decode(response.encoding or 'utf-8', errors='replace')
+
+
 def find_app_links_on_website(url):
     """Scrapes the website for app store links and returns IDs with high resilience."""
     found = {'android_id': None, 'apple_id': None}
@@ -28,27 +120,26 @@ def find_app_links_on_website(url):
             'Referer': 'https://www.google.com/'
         }
         
-        session = requests.Session()
-        soup = None
+        session = _SESSION
         html_content = ""
         
         # Some sites block initial request, retry once if needed
         try:
-            response = session.get(url, headers=headers, timeout=12)
+            response = session.get(url, headers=headers, timeout=12, stream=True)
             if response.status_code == 403:
+                response.close()
                 headers['User-Agent'] = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'
-                response = session.get(url, headers=headers, timeout=12)
+                response = session.get(url, headers=headers, timeout=12, stream=True)
             
-            # Print debug for verification
-            print(f"DEBUG: Scraped status code: {response.status_code}")
+            logger.debug(f"Scraped status code for {url}: {response.status_code}")
             
             if response.status_code == 200:
-                html_content = response.text
-                soup = BeautifulSoup(html_content, 'html.parser')
+                html_content = _read_html(response)
+            else:
+                response.close()
         except Exception as e:
-            print(f"DEBUG: Initial request failed for {url}: {e}")
             logger.warning(f"Initial request failed for {url}: {e}")
-            # Do not return; let response/soup be None so we fall through to headless
+            # Do not return; leave html_content empty so we fall through to headless
         
         # Blacklist for generic package IDs that are not the actual app
         package_blacklist = [
@@ -57,31 +148,39 @@ def find_app_links_on_website(url):
             'com.google.android.apps.messaging'
         ]
 
-        if soup:
+        # Only anchor hrefs and one meta tag are needed, so scan the markup with regexes
+        # instead of building a DOM; BeautifulSoup is kept for pages the regex can't read
+        hrefs = []
+        if html_content:
+            hrefs = [html.unescape(h) for h in _ANCHOR_HREF_RE.findall(html_content)]
+            meta_ios = _ITUNES_META_RE.search(html_content)
+            meta_ios_content = meta_ios.group(0) if meta_ios else None
+            
+            # Without a single store or redirector mention a DOM parse can't find anything either
+            if not hrefs and any(marker in html_content for marker in _STORE_LINK_MARKERS):
+                soup = BeautifulSoup(html_content, 'lxml')
+                hrefs = [link['href'] for link in soup.find_all('a', href=True)]
+                meta_tag = soup.find('meta', attrs={'name': 'apple-itunes-app'})
+                meta_ios_content = str(meta_tag['content']) if meta_tag and meta_tag.get('content') else None
+
             # 1. Check meta tags for IDs (Apple Smart App Banners)
-            meta_ios = soup.find('meta', attrs={'name': 'apple-itunes-app'})
-            if meta_ios and meta_ios.get('content'):
-                match = re.search(r'app-id=(\d+)', str(meta_ios['content']))
+            if meta_ios_content:
+                match = _ITUNES_APP_ID_RE.search(meta_ios_content)
                 if match:
                     found['apple_id'] = match.group(1)
                     logger.info(f"Found Apple ID in meta tag: {found['apple_id']}")
 
+        if hrefs:
             # 2. Search defined <a> tags and follow redirects
-            redirect_patterns = [
-                'go.link', 'onelink.me', 'page.link', 'app.link', 'adjust.com', 
-                'appsflyer.com', 'adj.st', 'link.me', 'smart.link', 'branch.io'
-            ]
-            
-            for link in soup.find_all('a', href=True):
+            for href in hrefs:
                 if found['android_id'] and found['apple_id']: break
-                href = link['href']
                 
                 # Simple direct patterns
                 if not found['android_id'] and 'play.google.com' in href:
-                    match = re.search(r'id=([a-zA-Z0-9_.]+)', href)
+                    match = _PLAY_ID_RE.search(href)
                     if match: found['android_id'] = match.group(1)
                 elif not found['apple_id'] and ('apps.apple.com' in href or 'itunes.apple.com' in href):
-                    match = re.search(r'id(\d+)', href)
+                    match = _APPLE_ID_RE.search(href)
                     if match: found['apple_id'] = match.group(1)
                 
                 # Tracker/Redirect detection
@@ -89,14 +188,14 @@ def find_app_links_on_website(url):
                     decoded_href = unquote(href)
                     # Check for nested play/apple store URLs in params (Invygo style)
                     if not found['android_id']:
-                        m = re.search(r'play\.google\.com/store/apps/details\?id=([a-zA-Z0-9_.]+)', decoded_href)
+                        m = _PLAY_URL_RE.search(decoded_href)
                         if m: found['android_id'] = m.group(1)
                     if not found['apple_id']:
-                        m = re.search(r'(?:apps|itunes)\.apple\.com(?:/[a-z]{2})?/app(?:/[^/]+)?/id(\d+)', decoded_href)
+                        m = _APPLE_URL_RE.search(decoded_href)
                         if m: found['apple_id'] = m.group(1)
 
                     # Follow redirect if ID still missing and domain matches OR looks like a local app link (Deliveroo)
-                    is_tracker = any(d in href for d in redirect_patterns)
+                    is_tracker = any(d in href for d in _REDIRECT_DOMAINS)
                     is_local_app_link = href.startswith('/') and ('/app' in href or 'download' in href or 'platform=' in href)
                     
                     if (not found['android_id'] or not found['apple_id']) and (is_tracker or is_local_app_link):
@@ -117,55 +216,46 @@ def find_app_links_on_website(url):
                         for ua in [headers['User-Agent'], 'Mozilla/5.0 (Linux; Android 14) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Mobile Safari/537.36']:
                             if found['android_id'] and found['apple_id']: break
                             try:
-                                resp = session.get(full_redirect_url, headers={'User-Agent': ua}, allow_redirects=True, timeout=8)
+                                # Only the landing URL matters, so HEAD is enough; some redirectors reject it
+                                resp = session.head(full_redirect_url, headers={'User-Agent': ua}, allow_redirects=True, timeout=5)
+                                if resp.status_code in (403, 405, 501):
+                                    # stream=True + close() follows the redirects without downloading the body
+                                    resp = session.get(full_redirect_url, headers={'User-Agent': ua}, allow_redirects=True, timeout=8, stream=True)
+                                    resp.close()
                                 final_url = unquote(resp.url)
                             except requests.exceptions.InvalidSchema as e:
                                 final_url = unquote(str(e).split("'")[1] if "'" in str(e) else str(e))
                             except: continue
                             
                             if not found['android_id']:
-                                m = re.search(r'play\.google\.com/store/apps/details\?id=([a-zA-Z0-9_.]+)', final_url)
-                                if not m: m = re.search(r'(?:id|package|android_id|pkg)=([a-zA-Z0-9_.]+)', final_url)
+                                m = _PLAY_URL_RE.search(final_url)
+                                if not m: m = _ANDROID_PARAM_RE.search(final_url)
                                 if m and m.group(1) not in package_blacklist and ('.' in m.group(1) or 'play.google.com' in final_url):
                                     found['android_id'] = m.group(1)
                             if not found['apple_id']:
-                                m = re.search(r'(?:apps|itunes)\.apple\.com(?:/[a-z]{2})?/app(?:/[^/]+)?/id(\d+)', final_url)
-                                if not m: m = re.search(r'(?:id|apple_id|ios_id)=(\d{9,12})', final_url)
-                                if not m: m = re.search(r'id(\d{9,12})', final_url)
+                                m = _APPLE_URL_RE.search(final_url)
+                                if not m: m = _APPLE_PARAM_RE.search(final_url)
+                                if not m: m = _APPLE_BARE_ID_RE.search(final_url)
                                 if m: found['apple_id'] = m.group(1)
 
         # 3. Final Deep Fallback: Search the entire raw HTML/Scripts/JSON
         if (not found['android_id'] or not found['apple_id']) and html_content:
             # Search in common places like JSON blobs or scripts
             if not found['android_id']:
-                android_patterns = [
-                    r'play\.google\.com/store/apps/details\?id=([a-zA-Z0-9_.]+)',
-                    r'"(?:package|appId|packageId|androidId|android_id)":\s*"([a-zA-Z0-9_.]+)"',
-                    r'package=([a-zA-Z0-9_.]+)',
-                    r'id=([a-zA-Z0-9_.]+)', # Generic id= pattern for some trackers
-                    r'com\.[a-zA-Z0-9_]+\.[a-zA-Z0-9_.]+', # Broad package pattern
-                    r'[a-zA-Z0-9_.]+\.[a-zA-Z0-9_.]+\.[a-zA-Z0-9_.]+'
-                ]
-                for p in android_patterns:
-                    matches = re.findall(p, html_content)
+                for p in _ANDROID_DEEP_PATTERNS:
+                    matches = p.findall(html_content)
                     for pkg_id in matches:
                         if pkg_id not in package_blacklist and len(pkg_id.split('.')) >= 2:
                             # Verify it looks like a package (at least one dot, no spaces, starts with letter)
-                            if re.match(r'^[a-z][a-z0-9_]*\.[a-z][a-z0-9_]*(\.[a-z][a-z0-9_.]*)*$', pkg_id):
+                            if _PACKAGE_NAME_RE.match(pkg_id):
                                 found['android_id'] = pkg_id
                                 logger.info(f"Deep fallback found Android ID on {url}: {pkg_id}")
                                 break
                     if found['android_id']: break
             
             if not found['apple_id']:
-                apple_patterns = [
-                    r'(?:apps|itunes)\.apple\.com(?:/[a-z]{2})?/app(?:/[^/]+)?/id(\d+)',
-                    r'"(?:appleId|iosId|trackId|itunesId|apple_id|ios_id)":\s*"?(\d+)"?',
-                    r'id(\d{9,12})',
-                    r'apple-itunes-app.*?content=".*?app-id=(\d+)'
-                ]
-                for p in apple_patterns:
-                    matches = re.findall(p, html_content)
+                for p in _APPLE_DEEP_PATTERNS:
+                    matches = p.findall(html_content)
                     for app_id in matches:
                         if len(app_id) >= 9:
                             found['apple_id'] = app_id
@@ -179,7 +269,8 @@ def find_app_links_on_website(url):
         if not found['android_id'] or not found['apple_id']:
             logger.info(f"Standard scraping failed for {url}. Attempting headless browser fallback...")
             try:
-                browser_found = fetch_with_browser(url)
+                with _BROWSER_SLOTS:
+                    browser_found = fetch_with_browser(url)
                 if not found['android_id'] and browser_found['android_id']:
                     found['android_id'] = browser_found['android_id']
                 if not found['apple_id'] and browser_found['apple_id']:
@@ -241,22 +332,22 @@ def fetch_with_browser(url):
                 
                 # Check for IDs in final URL
                 if 'play.google.com' in final_url:
-                    m = re.search(r'id=([a-zA-Z0-9_.]+)', final_url)
+                    m = _PLAY_ID_RE.search(final_url)
                     if m: found['android_id'] = m.group(1)
                 if 'apps.apple.com' in final_url or 'itunes.apple.com' in final_url:
-                    m = re.search(r'id(\d+)', final_url)
+                    m = _APPLE_ID_RE.search(final_url)
                     if m: found['apple_id'] = m.group(1)
                     
                 # Search within the rendered content (using same logic as deep search)
                 if not found['android_id']:
-                    matches = re.findall(r'play\.google\.com/store/apps/details\?id=([a-zA-Z0-9_.]+)', content)
+                    matches = _PLAY_URL_RE.findall(content)
                     for m in matches:
                         if m not in ['com.google.android.gms', 'com.android.vending']:
                             found['android_id'] = m
                             break
                 
                 if not found['apple_id']:
-                    matches = re.findall(r'(?:apps|itunes)\.apple\.com(?:/[a-z]{2})?/app(?:/[^/]+)?/id(\d+)', content)
+                    matches = _APPLE_URL_RE.findall(content)
                     if matches: found['apple_id'] = matches[0]
 
             except Exception as e:
@@ -269,21 +360,60 @@ def fetch_with_browser(url):
 
     return found
 
+# website -> (android_id, apple_id), memoized per process and persisted across runs since the
+# same competitors recur across users. Misses are not stored, since an empty result is as
+# likely a timeout or bot wall as a site without apps
+APP_IDS_CACHE_SIZE = 512
+APP_IDS_CACHE_TTL = int(os.getenv("APP_IDS_CACHE_TTL_DAYS", "30")) * 86400
+_app_ids_cache = {}
+_app_ids_cache_lock = threading.Lock()
+_app_ids_disk_cache = DiskCache("app_ids", APP_IDS_CACHE_TTL)
+
+def _remember_app_ids(website, result):
+    with _app_ids_cache_lock:
+        if len(_app_ids_cache) >= APP_IDS_CACHE_SIZE:
+            # Dicts keep insertion order, so this evicts the oldest entry
+            _app_ids_cache.pop(next(iter(_app_ids_cache)))
+        _app_ids_cache[website] = result
+
+def _scrape_app_ids(website):
+    with _app_ids_cache_lock:
+        cached = _app_ids_cache.get(website)
+    if cached is not None:
+        return cached
+    
+    cached = _app_ids_disk_cache.get(website)
+    if cached is not None:
+        logger.info(f"Using cached app IDs for {website}")
+        result = tuple(cached)
+        _remember_app_ids(website, result)
+        return result
+    
+    scraped_ids = find_app_links_on_website(website)
+    result = (scraped_ids.get('android_id'), scraped_ids.get('apple_id'))
+    if any(result):
+        _remember_app_ids(website, result)
+        _app_ids_disk_cache.set(website, result)
+    return result
+
+
 def resolve_app_ids(company_list, openai_key=None):
     """Main entry point to resolve app IDs for a list of companies using website scraping only."""
+    # Store links on the website are the ground truth, so every website is scraped and a
+    # scraped ID wins; IDs already on the company (analyze_url's Gemini guess) only fill what
+    # the scrape did not find. Competitor lists often repeat a website, so each is scraped once
+    websites = list(dict.fromkeys(c.get('website') for c in company_list if c.get('website')))
+    scraped = {}
+    if websites:
+        max_workers = max(1, min(RESOLVE_WORKERS, len(websites)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            scraped = dict(zip(websites, executor.map(_scrape_app_ids, websites)))
     
-    def process_company(company):
+    for company in company_list:
         website = company.get('website')
-        if not website: return company
-
-        scraped_ids = find_app_links_on_website(website)
-        
-        company['android_id'] = scraped_ids.get('android_id')
-        company['apple_id'] = scraped_ids.get('apple_id')
-        
-        return company
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        results = list(executor.map(process_company, company_list))
+        if website not in scraped: continue
+        android_id, apple_id = scraped[website]
+        company['android_id'] = android_id or company.get('android_id')
+        company['apple_id'] = apple_id or company.get('apple_id')
         
-    return results
+    return company_list
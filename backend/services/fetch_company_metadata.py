@@ -1,19 +1,55 @@
-from google import genai
-import json
 import logging
+import re
+from services import json_utils
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Structured-output schema for analyze_url, so Gemini emits exactly this JSON shape
+_APP_ID_SCHEMA = {"type": "STRING", "nullable": True}
+COMPANY_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "name": {"type": "STRING"},
+        "description": {"type": "STRING"},
+        "android_id": _APP_ID_SCHEMA,
+        "apple_id": _APP_ID_SCHEMA,
+        "competitors": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "name": {"type": "STRING"},
+                    "website": {"type": "STRING"},
+                    "region": {"type": "STRING"},
+                    "android_id": _APP_ID_SCHEMA,
+                    "apple_id": _APP_ID_SCHEMA
+                },
+                "required": ["name", "website", "region"]
+            }
+        }
+    },
+    "required": ["name", "description", "competitors"]
+}
+
+# Shape of a real Play package name / App Store id; anything else from the model is dropped.
+# These are only a fallback: resolve_app_ids prefers IDs scraped from the website
+ANDROID_ID_PATTERN = re.compile(r'^[a-zA-Z][a-zA-Z0-9_]*(?:\.[a-zA-Z][a-zA-Z0-9_]*)+$')
+APPLE_ID_PATTERN = re.compile(r'^(?:id)?(\d{9,12})$')
+
+def _app_id(value, pattern):
+    """Normalizes an app ID from the model's JSON to a string, or None if it is missing or malformed."""
+    if value is None:
+        return None
+    match = pattern.match(str(value).strip())
+    return match.group(match.lastindex or 0) if match else None
+
 def analyze_url(url: str, gemini_key: str):
     """
     Uses Gemini 3.1 Pro to extract company details and suggested competitors based on the URL.
     """
     try:
-        # Initialize Gemini Client
-        client = genai.Client(api_key=gemini_key)
-        
         import requests
         system_prompt = """
         You are an intelligent business research assistant with access to Google Search.
@@ -23,6 +59,7 @@ def analyze_url(url: str, gemini_key: str):
         2. **Determine its industry, core products/services, and primary markets.**
         3. **Find competitors** that operate in the **same industry** and **serve markets in either GCC countries or Egypt** (e.g., UAE, Saudi Arabia, Qatar, Kuwait, Bahrain, Oman, Egypt).
         4. **Return a structured list** of competitors.
+        5. **Give the mobile app IDs** of the company and of each competitor when they have apps: the Google Play package name (e.g. "com.example.app") and the numeric Apple App Store ID (e.g. "123456789"). Use null when you are not sure.
         
         Avoid listing companies that do not operate in Egypt or any GCC country.
         
@@ -33,11 +70,15 @@ def analyze_url(url: str, gemini_key: str):
         {
             "name": "Main Company Name",
             "description": "A short description of the main company (max 1 sentence)",
+            "android_id": "Google Play package name or null",
+            "apple_id": "App Store numeric ID or null",
             "competitors": [
                 {
                     "name": "Competitor Name",
                     "website": "Competitor Website URL",
-                    "region": "Country/Region"
+                    "region": "Country/Region",
+                    "android_id": "Google Play package name or null",
+                    "apple_id": "App Store numeric ID or null"
                 }
             ]
         }
@@ -52,18 +93,19 @@ def analyze_url(url: str, gemini_key: str):
                 "parts": [{"text": system_prompt + "\n\n" + user_message}]
             }],
             "generationConfig": {
-                "responseMimeType": "application/json"
+                "responseMimeType": "application/json",
+                "responseSchema": COMPANY_RESPONSE_SCHEMA
             }
         }
         resp = requests.post(endpoint, json=payload, timeout=60)
         resp.raise_for_status()
-        resp_data = resp.json()
+        resp_data = json_utils.loads(resp.content)
         
         # Extract text content
         content = resp_data["candidates"][0]["content"]["parts"][0]["text"]
         logger.info(f"Raw JSON Content (first 200 chars): {content[:200]}...")
 
-        data = json.loads(content)
+        data = json_utils.loads(content)
         
         # Format the result to match what the frontend expects (list of companies)
         # First item is the main company
@@ -71,8 +113,8 @@ def analyze_url(url: str, gemini_key: str):
             "company_name": data.get("name"),
             "website": url,
             "description": data.get("description"),
-            "android_id": None, 
-            "apple_id": None,   
+            "android_id": _app_id(data.get("android_id"), ANDROID_ID_PATTERN),
+            "apple_id": _app_id(data.get("apple_id"), APPLE_ID_PATTERN),
             "is_main": True
         }]
         
@@ -82,8 +124,8 @@ def analyze_url(url: str, gemini_key: str):
                 "company_name": comp.get("name"),
                 "website": comp.get("website"), 
                 "description": f"Competitor ({comp.get('region', 'Region Unknown')})",
-                "android_id": None,
-                "apple_id": None,
+                "android_id": _app_id(comp.get("android_id"), ANDROID_ID_PATTERN),
+                "apple_id": _app_id(comp.get("apple_id"), APPLE_ID_PATTERN),
                 "is_main": False
             })
             
@@ -1,12 +1,22 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import base64
+import hashlib
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from datetime import date, datetime
 import logging
 import os
+import random
+import re
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Dict
+from functools import lru_cache
+from services import json_utils
+from services.disk_cache import DiskCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,9 +27,26 @@ DATAFORSEO_LOGIN = os.getenv("DATAFORSEO_LOGIN", "info@horuscx.com")
 DATAFORSEO_PASSWORD = os.getenv("DATAFORSEO_PASSWORD", "ae38f0810ccce4ce")
 DATAFORSEO_BASE_URL = "https://api.dataforseo.com/v3"
 
-
+# One pooled session for task creation, polling and shortlink resolution, so the
+# dozens of polls per batch reuse keep-alive TLS connections to api.dataforseo.com.
+# Failed connections are retried for every method (nothing was sent yet); throttling/5xx
+# only for GET/HEAD, so a task_post that may have gone through is never duplicated.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=20,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "HEAD"]
+    )
+))
+
+
+@lru_cache(maxsize=1)
 def _get_auth_header() -> dict:
-    """Generate Basic Auth header for DataForSEO API"""
+    """Basic Auth header for DataForSEO API, built once (callers must not mutate it)"""
     credentials = f"{DATAFORSEO_LOGIN}:{DATAFORSEO_PASSWORD}"
     encoded = base64.b64encode(credentials.encode()).decode()
     return {
@@ -28,22 +55,32 @@ def _get_auth_header() -> dict:
     }
 
 
-def _parse_timestamp(timestamp_str: str) -> str:
-    """Parse DataForSEO timestamp to YYYY-MM-DD format"""
-    if not timestamp_str:
-        return datetime.now().strftime("%Y-%m-%d")
-    try:
-        # Format: "2024-01-15 12:57:46 +00:00"
-        dt = datetime.fromisoformat(timestamp_str.replace(" +00:00", "+00:00").replace(" ", "T", 1))
-        return dt.strftime("%Y-%m-%d")
-    except:
-        return datetime.now().strftime("%Y-%m-%d")
+# Raw task items per (target, location, language, depth). A place gains reviews slowly,
+# so a repeat scrape within a few hours reuses the billed result instead of a new task
+MAPS_REVIEWS_CACHE_TTL = int(os.getenv("MAPS_REVIEWS_CACHE_TTL", str(6 * 3600)))
+_items_cache = DiskCache("maps_reviews", MAPS_REVIEWS_CACHE_TTL)
+
+
+# DataForSEO's per-call task_post limit, and how many chunk POSTs may run at once
+TASK_POST_BATCH_SIZE = 100
+TASK_POST_CONCURRENCY = 4
+
+
+def _payload_target(payload: Dict) -> str:
+    """What a task was for (custom tag, keyword, place_id or cid)"""
+    return payload.get("tag") or payload.get("keyword") or payload.get("place_id") or payload.get("cid")
 
 
-def _create_review_tasks(tasks_payload: List[Dict]) -> Dict[str, str]:
+def _items_cache_key(payload: Dict) -> str:
+    target = next((f"{k}:{payload[k]}" for k in ("cid", "place_id", "keyword") if payload.get(k)), payload.get("tag"))
+    raw = f"{target}|{payload['location_name']}|{payload['language_name']}|{payload['depth']}"
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def _create_review_tasks(tasks_payload: List[Dict]) -> Dict[str, Dict]:
     """
     Create multiple review scraping tasks via DataForSEO API in a single POST.
-    Returns mapping of {task_id: original_target} if successful.
+    Returns mapping of {task_id: payload item} if successful.
     """
     url = f"{DATAFORSEO_BASE_URL}/business_data/google/reviews/task_post"
     
@@ -51,9 +88,10 @@ def _create_review_tasks(tasks_payload: List[Dict]) -> Dict[str, str]:
         return {}
 
     try:
-        response = requests.post(url, json=tasks_payload, headers=_get_auth_header(), timeout=30)
+        # Header already carries Content-Type: application/json
+        response = _SESSION.post(url, data=json_utils.dumps(tasks_payload), headers=_get_auth_header(), timeout=30)
         response.raise_for_status()
-        result = response.json()
+        result = json_utils.loads(response.content)
         
         task_mapping = {}
         if result.get("status_code") == 20000:
@@ -61,10 +99,8 @@ def _create_review_tasks(tasks_payload: List[Dict]) -> Dict[str, str]:
             for i, task in enumerate(tasks):
                 if task.get("status_code") == 20100:
                     task_id = task.get("id")
-                    # Track what this task was for (keyword, place_id, or custom tag)
-                    target = task.get("tag") or tasks_payload[i].get("tag") or tasks_payload[i].get("keyword") or tasks_payload[i].get("place_id") or tasks_payload[i].get("cid")
-                    task_mapping[task_id] = target
-                    logger.info(f"Task created: {task_id} for '{target}'")
+                    task_mapping[task_id] = tasks_payload[i]
+                    logger.info(f"Task created: {task_id} for '{task.get('tag') or _payload_target(tasks_payload[i])}'")
                 else:
                     logger.error(f"Task creation failed for item {i}: {task.get('status_message')}")
             return task_mapping
@@ -77,81 +113,189 @@ def _create_review_tasks(tasks_payload: List[Dict]) -> Dict[str, str]:
         return {}
 
 
-def _poll_for_results(task_id: str, max_attempts: int = 40, initial_wait: float = 2.0) -> list:
+def _create_review_tasks_batched(tasks_payload: List[Dict]) -> Dict[str, Dict]:
     """
-    Poll for task completion with exponential backoff.
-    Returns list of review items or empty list.
+    task_post accepts at most 100 tasks per call, so larger batches are split into
+    chunks posted a few at a time. Returns the merged {task_id: payload item} mapping.
+    """
+    chunks = [tasks_payload[i:i + TASK_POST_BATCH_SIZE] for i in range(0, len(tasks_payload), TASK_POST_BATCH_SIZE)]
+    if len(chunks) <= 1:
+        return _create_review_tasks(tasks_payload)
+    
+    task_mapping = {}
+    with ThreadPoolExecutor(max_workers=min(len(chunks), TASK_POST_CONCURRENCY)) as executor:
+        for chunk_mapping in executor.map(_create_review_tasks, chunks):
+            task_mapping.update(chunk_mapping)
+    return task_mapping
+
+
+# Max concurrent task_get requests while polling a batch
+POLL_CONCURRENCY = 10
+
+# Polling schedule: wait = min(initial * 1.6^step, 10s) + up to 0.5s jitter, within an overall deadline
+POLL_BACKOFF = 1.6
+POLL_MAX_WAIT = 10.0
+POLL_JITTER = 0.5
+POLL_MAX_TOTAL_WAIT = 360.0
+FAST_POLL_WAIT = 0.5
+
+
+def _check_task(task_id: str, attempt: int, max_attempts: int) -> Optional[list]:
+    """
+    Single task_get poll.
+    Returns the review items once the task has finished (empty list if it has no
+    results), or None while it is still processing or the poll failed.
     """
     url = f"{DATAFORSEO_BASE_URL}/business_data/google/reviews/task_get/{task_id}"
     
-    wait_time = initial_wait
+    try:
+        response = _SESSION.get(url, headers=_get_auth_header(), timeout=30)
+        result = json_utils.loads(response.content)
+        
+        tasks = result.get("tasks", [])
+        if not tasks:
+            logger.warning(f"Task {task_id}: No tasks in response (attempt {attempt + 1}/{max_attempts})")
+            return None
+            
+        task = tasks[0]
+        status_code = task.get("status_code")
+        status_message = task.get("status_message", "No message")
+        
+        # 20000 = success
+        if status_code == 20000:
+            task_result = task.get("result") or []
+            if task_result:
+                items = task_result[0].get("items") or []
+                logger.info(f"✅ Task {task_id}: Retrieved {len(items)} reviews")
+                return items
+            logger.warning(f"Task {task_id}: Success but no results")
+            return []
+        
+        # Task still processing
+        elif status_code in [40601, 40602]:  # Task in queue / processing
+            logger.debug(f"⏳ Task {task_id}: Still processing (attempt {attempt + 1}/{max_attempts}) - {status_message}")
+        
+        # No results found - terminal condition
+        elif status_code == 40102:
+            logger.warning(f"❌ Task {task_id}: No search results found - {status_message}")
+            return []
+            
+        else:
+            logger.warning(f"⚠️ Task {task_id}: Status {status_code} - {status_message} (attempt {attempt + 1}/{max_attempts})")
+            
+    except Exception as e:
+        logger.error(f"❌ Error polling task {task_id} (attempt {attempt + 1}/{max_attempts}): {e}")
+    return None
+
+
+def _poll_wait(initial_wait: float, step: int) -> float:
+    """Exponential backoff capped at POLL_MAX_WAIT, plus jitter so concurrent pollers don't sync up"""
+    return min(initial_wait * (POLL_BACKOFF ** step), POLL_MAX_WAIT) + random.uniform(0, POLL_JITTER)
+
+
+def _poll_for_results(task_id: str, max_attempts: int = 40, initial_wait: float = 2.0,
+                      max_total_wait: float = POLL_MAX_TOTAL_WAIT) -> list:
+    """
+    Poll for task completion with jittered exponential backoff, until max_attempts
+    polls or max_total_wait seconds have passed.
+    Returns list of review items or empty list.
+    """
+    deadline = time.monotonic() + max_total_wait
     
     logger.info(f"🔄 Starting to poll task {task_id} (max {max_attempts} attempts)")
     
     for attempt in range(max_attempts):
-        time.sleep(wait_time)
-        
-        try:
-            response = requests.get(url, headers=_get_auth_header(), timeout=30)
-            result = response.json()
-            
-            tasks = result.get("tasks", [])
-            if not tasks:
-                logger.warning(f"Task {task_id}: No tasks in response (attempt {attempt + 1}/{max_attempts})")
-                continue
-                
-            task = tasks[0]
-            status_code = task.get("status_code")
-            status_message = task.get("status_message", "No message")
-            
-            # 20000 = success
-            if status_code == 20000:
-                task_result = task.get("result") or []
-                if task_result:
-                    items = task_result[0].get("items") or []
-                    logger.info(f"✅ Task {task_id}: Retrieved {len(items)} reviews")
-                    return items
-                logger.warning(f"Task {task_id}: Success but no results")
-                return []
+        # First poll goes out immediately; short tasks (and repeat places) are often already done
+        if attempt > 0:
+            time.sleep(_poll_wait(initial_wait, attempt - 1))
+        items = _check_task(task_id, attempt, max_attempts)
+        if items is not None:
+            return items
+        if time.monotonic() >= deadline:
+            break
+    
+    logger.error(f"⏱️ Task {task_id}: TIMEOUT after {attempt + 1} attempts")
+    return []
+
+
+def _poll_many(task_ids: List[str], max_attempts: int = 40, initial_wait: float = 2.0,
+               max_total_wait: float = POLL_MAX_TOTAL_WAIT):
+    """
+    Poll a batch of tasks in rounds, yielding (task_id, items) as each one finishes.
+    Only this loop sleeps between rounds; pool threads are used just for the task_get
+    calls of still-pending tasks, so batch size isn't capped by sleeping worker threads.
+    """
+    pending = list(task_ids)
+    deadline = time.monotonic() + max_total_wait
+    step = 0
+    fast_polling = False
+    
+    logger.info(f"🔄 Starting to poll {len(pending)} tasks (max {max_attempts} rounds)")
+    
+    with ThreadPoolExecutor(max_workers=min(len(pending), POLL_CONCURRENCY) or 1) as executor:
+        for attempt in range(max_attempts):
+            if not pending or time.monotonic() >= deadline:
+                break
+            # First round goes out immediately; short tasks are often already done
+            if attempt > 0:
+                time.sleep(_poll_wait(initial_wait, step))
+                step += 1
             
-            # Task still processing
-            elif status_code in [40601, 40602]:  # Task in queue / processing
-                logger.debug(f"⏳ Task {task_id}: Still processing (attempt {attempt + 1}/{max_attempts}) - {status_message}")
-                wait_time = min(wait_time * 1.5, 10.0)  # Cap at 10 seconds
+            statuses = executor.map(lambda tid: _check_task(tid, attempt, max_attempts), pending)
+            still_pending = []
+            for task_id, items in zip(pending, statuses):
+                if items is None:
+                    still_pending.append(task_id)
+                else:
+                    yield task_id, items
             
-            # No results found - terminal condition
-            elif status_code == 40102:
-                logger.warning(f"❌ Task {task_id}: No search results found - {status_message}")
-                return []
-                
-            else:
-                logger.warning(f"⚠️ Task {task_id}: Status {status_code} - {status_message} (attempt {attempt + 1}/{max_attempts})")
-                wait_time = min(wait_time * 1.5, 10.0)
-                
-        except Exception as e:
-            logger.error(f"❌ Error polling task {task_id} (attempt {attempt + 1}/{max_attempts}): {e}")
+            # Tasks in a batch finish at about the same time, so once the first one is done
+            # restart the backoff from a short wait for the rest
+            if not fast_polling and len(still_pending) < len(pending):
+                fast_polling = True
+                initial_wait = FAST_POLL_WAIT
+                step = 0
+            pending = still_pending
     
-    logger.error(f"⏱️ Task {task_id}: TIMEOUT after {max_attempts} attempts")
-    return []
+    for task_id in pending:
+        logger.error(f"⏱️ Task {task_id}: TIMEOUT while polling")
+
+
+def _review_rating(item: dict):
+    rating = item.get("rating")
+    return rating.get("value", 0) if isinstance(rating, dict) else 0
 
 
 def _parse_reviews(items: list) -> pd.DataFrame:
-    """Parse DataForSEO review items into a DataFrame"""
-    reviews = []
+    """
+    Parse DataForSEO review items into a DataFrame.
+    Columns are collected in one pass and the DataFrame is built once; 'date' is a
+    day-precision datetime column, formatted back to YYYY-MM-DD by _apply_date_filter.
+    """
+    # Drop non-review entries once, so column extraction below has no per-row branching
+    items = [item for item in items if item.get("type") == "google_reviews_search"]
+    if not items:
+        return pd.DataFrame()
     
-    for item in items:
-        if item.get("type") != "google_reviews_search":
-            continue
-            
-        reviews.append({
-            "text": item.get("review_text", "") or item.get("original_review_text", "") or "",
-            "rating": item.get("rating", {}).get("value", 0) if isinstance(item.get("rating"), dict) else 0,
-            "date": _parse_timestamp(item.get("timestamp")),
-            "source_user": item.get("profile_name", "Anonymous"),
-            "platform": "Google Maps"
-        })
+    # One comprehension per column: each is a tight loop over a single key
+    texts = [item.get("review_text", "") or item.get("original_review_text", "") or "" for item in items]
+    ratings = [_review_rating(item) for item in items]
+    timestamps = [item.get("timestamp") for item in items]
+    users = [item.get("profile_name", "Anonymous") for item in items]
     
-    return pd.DataFrame(reviews)
+    # Format: "2024-01-15 12:57:46 +00:00"; missing or malformed timestamps count as today
+    dates = pd.to_datetime(pd.Series(timestamps), format="%Y-%m-%d %H:%M:%S %z", errors="coerce", utc=True)
+    dates = dates.dt.tz_convert(None).dt.normalize().fillna(pd.Timestamp.now().normalize())
+    
+    # Explicit column types instead of inference: nullable int8 ratings, and a categorical
+    # platform column that stores the constant label once
+    return pd.DataFrame({
+        "text": pd.array(texts, dtype="string"),
+        "rating": pd.array(ratings, dtype="Int8"),
+        "date": dates,
+        "source_user": pd.array(users, dtype="string"),
+        "platform": pd.Categorical.from_codes(np.zeros(len(texts), dtype=np.int8), categories=["Google Maps"])
+    })
 
 
 # Default depth for incremental syncs (since_date provided).
@@ -160,6 +304,35 @@ def _parse_reviews(items: list) -> pd.DataFrame:
 INCREMENTAL_SYNC_DEPTH = 50
 FULL_SYNC_DEPTH = 300
 
+# Target parsing for _prepare_payload_item
+_SHORTLINK_MARKERS = ("maps.app.goo.gl", "goo.gl", "g.page")
+_MAPS_MARKERS = ("google.com/maps", "goo.gl", "maps.app.goo.gl")
+_CID_RE = re.compile(r'0x[0-9a-f]+:(0x[0-9a-f]+)')
+_PLACE_RE = re.compile(r'/maps/place/([^/]+)')
+_SEARCH_RE = re.compile(r'/maps/search/([^/?]+)')
+
+
+def _fetch_review_items(payload: Dict) -> list:
+    """Review items for a single payload, from the disk cache or a new task"""
+    cache_key = _items_cache_key(payload)
+    items = _items_cache.get(cache_key)
+    if items is not None:
+        logger.info(f"📦 Using cached reviews for '{_payload_target(payload)}'")
+        return items
+    
+    # Single item batch
+    task_mapping = _create_review_tasks([payload])
+    
+    if not task_mapping:
+        logger.error(f"Could not create review task for '{_payload_target(payload)}'")
+        return []
+    
+    task_id = next(iter(task_mapping))
+    items = _poll_for_results(task_id)
+    if items:
+        _items_cache.set(cache_key, items)
+    return items
+
 
 def scrape_google_maps_reviews(keyword_or_url: str, location: str = "Saudi Arabia",
                                 language: str = "English", max_reviews: int = 100,
@@ -175,15 +348,7 @@ def scrape_google_maps_reviews(keyword_or_url: str, location: str = "Saudi Arabi
     # Use smaller depth for incremental syncs to save API cost
     depth = INCREMENTAL_SYNC_DEPTH if since_date else max(FULL_SYNC_DEPTH, max_reviews)
     target_data = _prepare_payload_item(keyword_or_url, location, language, depth)
-    
-    # Single item batch
-    task_mapping = _create_review_tasks([target_data])
-    
-    if not task_mapping:
-        return pd.DataFrame()
-    
-    task_id = list(task_mapping.keys())[0]
-    items = _poll_for_results(task_id)
+    items = _fetch_review_items(target_data)
     
     if not items:
         return pd.DataFrame()
@@ -196,22 +361,16 @@ def scrape_google_maps_reviews(keyword_or_url: str, location: str = "Saudi Arabi
     if since_date and len(filtered_df) == len(df) and len(df) >= depth and depth < FULL_SYNC_DEPTH:
         logger.info(f"🔄 All {len(df)} reviews were new — retrying with full depth ({FULL_SYNC_DEPTH})")
         target_data = _prepare_payload_item(keyword_or_url, location, language, FULL_SYNC_DEPTH)
-        task_mapping = _create_review_tasks([target_data])
-        if task_mapping:
-            task_id = list(task_mapping.keys())[0]
-            items = _poll_for_results(task_id)
-            if items:
-                df = _parse_reviews(items)
-                filtered_df = _apply_date_filter(df, since_date)
+        items = _fetch_review_items(target_data)
+        if items:
+            df = _parse_reviews(items)
+            filtered_df = _apply_date_filter(df, since_date)
 
     return filtered_df
 
 
 def _prepare_payload_item(target: str, location: str, language: str, depth: int) -> Dict:
     """Helper to prepare a single task payload item"""
-    import urllib.parse
-    import re
-    
     payload = {
         "language_name": language,
         "location_name": location,
@@ -221,15 +380,15 @@ def _prepare_payload_item(target: str, location: str, language: str, depth: int)
     }
 
     # Resolve shortlinks
-    if "maps.app.goo.gl" in target or "goo.gl" in target or "g.page" in target:
+    if any(s in target for s in _SHORTLINK_MARKERS):
         try:
-            resp = requests.head(target, allow_redirects=True, timeout=10)
+            resp = _SESSION.head(target, allow_redirects=True, timeout=10)
             target = resp.url
         except Exception as e:
             logger.error(f"Failed to resolve shortlink {target}: {e}")
 
     # CID Extraction
-    cid_match = re.search(r'0x[0-9a-f]+:(0x[0-9a-f]+)', target)
+    cid_match = _CID_RE.search(target)
     if cid_match:
         payload["cid"] = str(int(cid_match.group(1), 16))
         return payload
@@ -238,7 +397,7 @@ def _prepare_payload_item(target: str, location: str, language: str, depth: int)
     place_id_found = None
     keyword = target
 
-    if any(s in target for s in ["google.com/maps", "goo.gl", "maps.app.goo.gl"]):
+    if any(s in target for s in _MAPS_MARKERS):
         parsed = urllib.parse.urlparse(target)
         params = urllib.parse.parse_qs(parsed.query)
         
@@ -250,10 +409,10 @@ def _prepare_payload_item(target: str, location: str, language: str, depth: int)
             else:
                 keyword = query_val
         elif "/maps/place/" in target:
-            match = re.search(r'/maps/place/([^/]+)', target)
+            match = _PLACE_RE.search(target)
             if match: keyword = urllib.parse.unquote_plus(match.group(1))
         elif "/maps/search/" in target:
-            match = re.search(r'/maps/search/([^/?]+)', target)
+            match = _SEARCH_RE.search(target)
             if match: keyword = urllib.parse.unquote_plus(match.group(1))
 
     if keyword and str(keyword).startswith("place_id:"):
@@ -268,6 +427,12 @@ def _prepare_payload_item(target: str, location: str, language: str, depth: int)
     return payload
 
 
+@lru_cache(maxsize=1)
+def _default_cutoff(today: date) -> pd.Timestamp:
+    """Start of the default 6-month window; recomputed at most once per day"""
+    return pd.Timestamp(today) - pd.DateOffset(months=6)
+
+
 def _apply_date_filter(df: pd.DataFrame, since_date: Optional[datetime] = None) -> pd.DataFrame:
     """Filter DataFrame for reviews since the specified date or last 6 months by default.
     Reviews are expected to be sorted newest-first (sort_by=newest from API)."""
@@ -279,18 +444,22 @@ def _apply_date_filter(df: pd.DataFrame, since_date: Optional[datetime] = None)
             limit_date = pd.Timestamp(since_date)
             logger.info(f"--- 📅 Incremental Sync: Filtering reviews since {limit_date} ---")
         else:
-            limit_date = pd.Timestamp(datetime.now() - pd.DateOffset(months=6))
+            limit_date = _default_cutoff(datetime.now().date())
             logger.info(f"--- 📅 Date Filter: Defaulting to last 6 months (since {limit_date}) ---")
             
-        df['date'] = pd.to_datetime(df['date'])
+        dates = df['date']
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates)
+        # Compare the raw datetime64 array against the cutoff, then format only the kept rows
+        mask = dates.to_numpy() >= limit_date.to_datetime64()
         original_count = len(df)
-        df = df[df['date'] >= limit_date]
+        df = df.loc[mask].assign(date=dates[mask].dt.strftime('%Y-%m-%d'))
         logger.info(f"--- 📅 Date Filter Result: Kept {len(df)}/{original_count} reviews ---")
-        df['date'] = df['date'].dt.strftime('%Y-%m-%d')
         return df
     except Exception as e:
         logger.error(f"Error filtering dates: {e}")
-        return df
+        # Unfiltered, but with the same YYYY-MM-DD date strings as the normal path
+        return df.assign(date=pd.to_datetime(df['date'], errors='coerce').dt.strftime('%Y-%m-%d'))
 
 
 def scrape_multiple_locations(locations: list, max_reviews_per_location: int = 100,
@@ -320,41 +489,70 @@ def scrape_multiple_locations(locations: list, max_reviews_per_location: int = 1
     if not payloads:
         return pd.DataFrame()
 
-    # Create all tasks in one or more batches (DataForSEO accepts up to 100 per call)
-    task_mapping = _create_review_tasks(payloads)
+    # Review items from every location, with a parallel source_location column, so the
+    # batch is parsed and date-filtered once instead of building and concatenating a frame per location
+    review_items = []
+    source_locations = []
     
-    if not task_mapping:
-        return pd.DataFrame()
-
-    all_dfs = []
+    def add_reviews(items, targets):
+        reviews = [item for item in items if item.get("type") == "google_reviews_search"]
+        for target in targets:
+            review_items.extend(reviews)
+            source_locations.extend([target] * len(reviews))
     
-    # Poll all tasks in parallel
-    def poll_and_parse(task_id, target_name):
-        items = _poll_for_results(task_id)
-        if not items: return pd.DataFrame()
-        df = _parse_reviews(items)
-        df = _apply_date_filter(df, since_date)
-        if not df.empty:
-            df["source_location"] = target_name
-        return df
-
-    with ThreadPoolExecutor(max_workers=min(len(task_mapping), 10)) as executor:
-        futures = {executor.submit(poll_and_parse, tid, target): tid for tid, target in task_mapping.items()}
+    # Duplicate targets (the same place listed twice upstream) share one task, and its
+    # reviews are fanned back out to each distinct source_location name
+    targets_by_key = {}
+    unique_payloads = {}
+    for payload in payloads:
+        key = _items_cache_key(payload)
+        unique_payloads.setdefault(key, payload)
+        # dict as an insertion-ordered set of target names
+        targets_by_key.setdefault(key, {})[_payload_target(payload)] = None
+    if len(unique_payloads) < len(payloads):
+        logger.info(f"--- 🔁 {len(payloads) - len(unique_payloads)} duplicate locations merged ---")
+    
+    # Places scraped recently are served from the disk cache; only the rest become tasks
+    uncached = []
+    for key, payload in unique_payloads.items():
+        items = _items_cache.get(key)
+        if items is None:
+            uncached.append(payload)
+        else:
+            add_reviews(items, targets_by_key[key])
+    if len(uncached) < len(unique_payloads):
+        logger.info(f"--- 📦 {len(unique_payloads) - len(uncached)}/{len(unique_payloads)} locations served from cache ---")
+
+    if uncached:
+        # Create all tasks in one or more batches (DataForSEO accepts up to 100 per call)
+        task_mapping = _create_review_tasks_batched(uncached)
+        created = {_items_cache_key(payload) for payload in task_mapping.values()}
+        for payload in uncached:
+            if _items_cache_key(payload) not in created:
+                logger.error(f"Could not create review task for '{_payload_target(payload)}'")
         
-        for future in as_completed(futures):
-            try:
-                res_df = future.result()
-                if not res_df.empty:
-                    all_dfs.append(res_df)
-            except Exception as e:
-                logger.error(f"Error processing task: {e}")
+        # Poll all tasks together and collect each one as soon as it finishes
+        for task_id, items in _poll_many(list(task_mapping)):
+            key = _items_cache_key(task_mapping[task_id])
+            if items:
+                _items_cache.set(key, items)
+            add_reviews(items, targets_by_key[key])
     
-    if all_dfs:
-        combined = pd.concat(all_dfs, ignore_index=True)
-        logger.info(f"--- ✅ Batch complete: {len(combined)} total reviews ---")
-        return combined
+    if not review_items:
+        return pd.DataFrame()
+    
+    try:
+        df = _parse_reviews(review_items)
+        df["source_location"] = source_locations
+        combined = _apply_date_filter(df, since_date).reset_index(drop=True)
+    except Exception as e:
+        logger.error(f"Error processing batch reviews: {e}")
+        return pd.DataFrame()
+    if combined.empty:
+        return pd.DataFrame()
     
-    return pd.DataFrame()
+    logger.info(f"--- ✅ Batch complete: {len(combined)} total reviews ---")
+    return combined
 
 
 def scrape_google_maps_by_place_id(place_id: str, max_reviews: int = 100,
@@ -1,11 +1,14 @@
 import pandas as pd
 from google_play_scraper import Sort, reviews
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 
 from datetime import datetime
 import concurrent.futures
 import logging
+import threading
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -44,6 +47,22 @@ COUNTRIES = ['sa', 'ae', 'kw', 'bh', 'qa', 'om', 'us', 'eg']
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "horus-voc-data-storage-v2-eu")
 AWS_REGION = os.getenv("AWS_REGION", "eu-central-1")
 
+# Shared by all App Store RSS page fetches (countries x pages run in parallel), so pages
+# after the first reuse keep-alive connections to itunes.apple.com instead of new TLS handshakes
+APP_STORE_PAGE_WORKERS = 5
+_APP_STORE_SESSION = requests.Session()
+_APP_STORE_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=len(COUNTRIES),
+    pool_maxsize=len(COUNTRIES) * APP_STORE_PAGE_WORKERS,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+# RSS page URL -> (ETag, Last-Modified, trimmed entries), per process. Unchanged pages come
+# back as an empty 304 and are served from here instead of being re-downloaded and re-parsed
+APP_STORE_FEED_CACHE_PAGES = int(os.getenv("APP_STORE_FEED_CACHE_PAGES", "1024"))
+_feed_cache = {}
+_feed_cache_lock = threading.Lock()
+
 def upload_to_s3(file_path, object_name=None):
     """
     Upload a file to an S3 bucket and return the object key.
@@ -128,6 +147,45 @@ def scrape_google_play(brand_name, app_id, since_date=None):
     return df
 
 # 2. Apple App Store Scraper
+def _fetch_feed_entries(url):
+    """
+    Returns an App Store RSS page's entries as (updated, content, rating, author) labels,
+    revalidating a previously fetched copy with If-None-Match / If-Modified-Since.
+    """
+    with _feed_cache_lock:
+        cached = _feed_cache.get(url)
+    headers = {}
+    if cached:
+        etag, last_modified, _ = cached
+        if etag: headers["If-None-Match"] = etag
+        if last_modified: headers["If-Modified-Since"] = last_modified
+
+    resp = _APP_STORE_SESSION.get(url, headers=headers, timeout=(3, 5))
+    if resp.status_code == 304 and cached:
+        return cached[2]
+    if resp.status_code != 200: return []
+
+    entries = resp.json().get('feed', {}).get('entry', [])
+    if isinstance(entries, dict): entries = [entries]
+    # Only the fields scrape_app_store reads are kept, so cached pages stay small
+    entries = [
+        (
+            entry.get('updated', {}).get('label', ''),
+            entry.get('content', {}).get('label', ''),
+            entry.get('im:rating', {}).get('label', '0'),
+            entry.get('author', {}).get('name', {}).get('label', 'Anonymous'),
+        )
+        for entry in entries
+    ]
+    etag, last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+    if entries and (etag or last_modified):
+        with _feed_cache_lock:
+            if url not in _feed_cache and len(_feed_cache) >= APP_STORE_FEED_CACHE_PAGES:
+                # Dicts keep insertion order, so this evicts the oldest page
+                _feed_cache.pop(next(iter(_feed_cache)))
+            _feed_cache[url] = (etag, last_modified, entries)
+    return entries
+
 def scrape_app_store(brand_name, app_id, since_date=None):
     if not app_id: return pd.DataFrame()
     logger.info(f"--- 🍎 Starting Apple App Store Scrape for {brand_name} ---")
@@ -139,25 +197,20 @@ def scrape_app_store(brand_name, app_id, since_date=None):
         def fetch_page(page):
             url = f"https://itunes.apple.com/{country}/rss/customerreviews/page={page}/id={app_id}/sortBy=mostRecent/json"
             try:
-                resp = requests.get(url, timeout=5)
-                if resp.status_code != 200: return []
-                data = resp.json()
-                entries = data.get('feed', {}).get('entry', [])
+                entries = _fetch_feed_entries(url)
                 if not entries: return []
-                if isinstance(entries, dict): entries = [entries]
                 
                 page_reviews = []
-                for entry in entries:
+                for date_str, text, rating, author in entries:
                     try:
-                        date_str = entry.get('updated', {}).get('label', '')
                         entry_date = pd.to_datetime(date_str)
                         if entry_date.tz_localize(None) < limit_date:
                             continue
                         review = {
-                            'text': entry.get('content', {}).get('label', ''),
-                            'rating': int(entry.get('im:rating', {}).get('label', '0')),
+                            'text': text,
+                            'rating': int(rating),
                             'date': entry_date.strftime('%Y-%m-%d'),
-                            'source_user': entry.get('author', {}).get('name', {}).get('label', 'Anonymous'),
+                            'source_user': author,
                             'platform': f'App Store ({country.upper()})',
                             'brand': brand_name
                         }
@@ -167,7 +220,7 @@ def scrape_app_store(brand_name, app_id, since_date=None):
             except: return []
 
         # Fetch up to 10 pages in parallel
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as page_executor:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=APP_STORE_PAGE_WORKERS) as page_executor:
             futures = [page_executor.submit(fetch_page, p) for p in range(1, 11)]
             for future in concurrent.futures.as_completed(futures):
                 res = future.result()
@@ -0,0 +1,34 @@
+"""
+JSON helpers for hot paths (LLM responses, S3 status/checkpoint bodies).
+
+Uses orjson when installed and falls back to the stdlib json module otherwise.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj) -> bytes:
+    """Serialize obj to UTF-8 encoded JSON bytes (accepted directly by s3.put_object)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            # e.g. non-str dict keys, which stdlib json coerces
+            pass
+    return json.dumps(obj).encode("utf-8")
+
+
+def loads(data):
+    """Parse JSON from str or bytes."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # stdlib json is more lenient (NaN/Infinity literals in LLM output)
+            pass
+    return json.loads(data)